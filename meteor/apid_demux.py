@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+#
+# apid_demux.py - GNU Radio PDU block (space packets -> one message port per APID)
+#
+# Input:  message port 'in', space packet PDUs from SpacePacketAssembler
+# Output: one message port per entry of the APID -> port map, and 'unmatched'
+#         for packets of other APIDs (only published with catch_all=True)
+#
+import pmt
+from gnuradio import gr
+
+
+# Meteor M2.x LRPT: MSU-MR channels 1-6 and telemetry
+APID_PORTS = {
+    64: "msu_mr_1",
+    65: "msu_mr_2",
+    66: "msu_mr_3",
+    67: "msu_mr_4",
+    68: "msu_mr_5",
+    69: "msu_mr_6",
+    70: "telemetry",
+}
+
+
+class ApidDemux(gr.basic_block):
+    """
+    Routes space packets by APID with one dict lookup, instead of every
+    packet going to an ApidFilter per APID.
+
+    The APID is read from meta[key] (SpacePacketAssembler strips the
+    primary header, so it is not in the payload any more) with a single
+    dict_ref. Several APIDs may share a port.
+
+    Counters:
+      packets    number of packets seen per APID (matched or not)
+      unmatched  packets of APIDs without a port
+      invalid    messages that are not a PDU with a dict meta holding an
+                 integer APID
+    """
+
+    def __init__(self, apid_ports=None, catch_all=False, key="space_packet.apid"):
+        gr.basic_block.__init__(self, name="apid_demux", in_sig=None, out_sig=None)
+
+        apid_ports = APID_PORTS if apid_ports is None else apid_ports
+        self._ports = {int(apid): pmt.intern(str(name)) for apid, name in apid_ports.items()}
+        self._unmatched_port = pmt.intern("unmatched")
+        self.catch_all = bool(catch_all)
+
+        self._key = pmt.intern(str(key))
+
+        self.packets = {}
+        self.unmatched = 0
+        self.invalid = 0
+
+        for port in dict.fromkeys(self._ports.values()):
+            self.message_port_register_out(port)
+        self.message_port_register_out(self._unmatched_port)
+
+        self.message_port_register_in(pmt.intern("in"))
+        self.set_msg_handler(pmt.intern("in"), self._handle_msg)
+
+    def set_catch_all(self, catch_all):
+        self.catch_all = bool(catch_all)
+
+    def _handle_msg(self, msg):
+        # Expect PDU pair: (meta, data)
+        if not pmt.is_pair(msg) or not pmt.is_dict(pmt.car(msg)):
+            self.invalid += 1
+            return
+
+        apid_pmt = pmt.dict_ref(pmt.car(msg), self._key, pmt.PMT_NIL)
+        if not pmt.is_integer(apid_pmt):
+            self.invalid += 1
+            return
+
+        apid = pmt.to_long(apid_pmt)
+        self.packets[apid] = self.packets.get(apid, 0) + 1
+
+        port = self._ports.get(apid)
+        if port is not None:
+            self.message_port_pub(port, msg)
+        else:
+            self.unmatched += 1
+            if self.catch_all:
+                self.message_port_pub(self._unmatched_port, msg)
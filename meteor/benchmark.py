@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+#
+# benchmark.py - per CADU cost of the CADU -> space packet path
+#
+# Feeds synthetic CADUs (random space packets of APID 64..70, VCDU framed,
+# RS encoded and scrambled like the satellite does) through
+#   - chain: CcsdsDescrambler -> CcsdsRsDecoder -> VcduParser ->
+#            SpacePacketAssembler -> ApidDemux
+#   - fused: CaduToPackets
+# calling the message handlers directly (no scheduler), and checks that both
+# give the same packets. The check is repeated on two interleaved virtual
+# channels with FAILING_ERRORS byte errors per CADU, where a good part of the
+# codewords are uncorrectable, for both pass_failed settings (which must give
+# the same packets, tagged frames are ignored like dropped ones).
+#
+# Every run also checks that each packet out of either path is a packet of the
+# source stream (in order per APID), and that lost_packets counts the packets
+# missing in between. --drop leaves out that fraction of the CADUs, like sync
+# losses would.
+#
+# --blocks additionally times each PDU block of the chain on its own (replaying
+# the messages it gets in the chain run), and the u8vector <-> numpy payload
+# conversion of pdu.py against the element-wise pmt calls at the message sizes
+# of the CADU, packet and image row blocks.
+#
+#   python benchmark.py [--frames 200] [--errors 0] [--drop 0.0] [--blocks]
+#
+import argparse
+import time
+
+import numpy as np
+import pmt
+
+from apid_demux import APID_PORTS, ApidDemux
+from cadu_to_packets import CaduToPackets
+from ccsds_descrambler import CcsdsDescrambler, ccsds_pn_sequence
+from ccsds_rs_decoder import CcsdsRsDecoder
+from pdu import numpy_to_u8vector, u8vector_to_numpy
+from reed_solomon import KK, NN, encode_interleaved
+from space_packet_assembler import SpacePacketAssembler
+from vcdu_parser import VcduParser
+
+
+INTERLEAVE = 4
+FRAME_LEN = NN * INTERLEAVE
+VCDU_LEN = KK * INTERLEAVE
+MPDU_DATA_LEN = VCDU_LEN - 6 - 2 - 2   # VCDU header, insert zone, MPDU header
+
+FAILING_ERRORS = 48  # ~12 per codeword, about a third of the CADUs fail RS
+
+
+# ---------------- TEST DATA ----------------
+
+def make_packet_stream(rng, n_bytes):
+    """Random space packets of APID 64..70 back to back."""
+    stream = bytearray()
+    counts = {}  # sequence count per APID
+    while len(stream) < n_bytes:
+        apid = int(rng.integers(64, 71))
+        data_len = int(rng.integers(60, 900))
+        count = counts.get(apid, 0)
+        counts[apid] = count + 1
+        stream += bytes([
+            0x08 | (apid >> 8), apid & 0xFF,
+            0xC0 | ((count >> 8) & 0x3F), count & 0xFF,
+            (data_len - 1) >> 8, (data_len - 1) & 0xFF,
+        ])
+        stream += rng.integers(0, 256, data_len, dtype=np.uint8).tobytes()
+    return bytes(stream)
+
+
+def packet_starts(stream):
+    starts = set()
+    pos = 0
+    while pos + 6 <= len(stream):
+        starts.add(pos)
+        pos += 6 + ((stream[pos + 4] << 8) | stream[pos + 5]) + 1
+    return starts
+
+
+def source_packets(stream, vcid):
+    """data field -> (vcid, apid, sequence count) of every complete packet of stream."""
+    packets = {}
+    for pos in sorted(packet_starts(stream)):
+        end = pos + 6 + ((stream[pos + 4] << 8) | stream[pos + 5]) + 1
+        if end <= len(stream):
+            apid = ((stream[pos] & 0x07) << 8) | stream[pos + 1]
+            count = ((stream[pos + 2] & 0x3F) << 8) | stream[pos + 3]
+            packets[stream[pos + 6:end]] = (vcid, apid, count)
+    return packets
+
+
+def make_cadus(n_frames, errors=0, seed=0, vcids=(5,), drop=0.0):
+    """
+    n_frames scrambled, RS encoded CADUs (packed bytes, no ASM) as PDUs. The
+    frames take turns between the virtual channels vcids, each with its own
+    packet stream and frame counter. A `drop` fraction of the frames is left
+    out (their counter values are skipped).
+
+    Returns (pdus, source_packets of all streams).
+    """
+    rng = np.random.default_rng(seed)
+    streams = []
+    source = {}
+    for k, vcid in enumerate(vcids):
+        stream = make_packet_stream(rng, len(range(k, n_frames, len(vcids))) * MPDU_DATA_LEN)
+        streams.append((stream, packet_starts(stream)))
+        source.update(source_packets(stream, vcid))
+    pn = ccsds_pn_sequence(FRAME_LEN)
+    dropped = rng.random(n_frames) < drop if drop > 0 else np.zeros(n_frames, dtype=bool)
+
+    pdus = []
+    for i in range(n_frames):
+        if dropped[i]:
+            continue
+
+        vcid = vcids[i % len(vcids)]
+        stream, starts = streams[i % len(vcids)]
+        n = i // len(vcids)  # frame number within the virtual channel
+
+        zone = stream[n * MPDU_DATA_LEN:(n + 1) * MPDU_DATA_LEN]
+        first = [p - n * MPDU_DATA_LEN for p in starts if n * MPDU_DATA_LEN <= p < (n + 1) * MPDU_DATA_LEN]
+        fhp = min(first) if first else 0x7FF
+
+        vcdu = bytes([0x40, vcid, (n >> 16) & 0xFF, (n >> 8) & 0xFF, n & 0xFF, 0x00, 0x00, 0x00, fhp >> 8, fhp & 0xFF]) + zone
+        frame = encode_interleaved(np.frombuffer(vcdu, dtype=np.uint8), INTERLEAVE)
+        if errors > 0:
+            frame[rng.choice(FRAME_LEN, errors, replace=False)] ^= rng.integers(1, 256, errors, dtype=np.uint8)
+        frame ^= pn
+
+        vec = pmt.init_u8vector(FRAME_LEN, frame)
+        pdus.append(pmt.cons(pmt.make_dict(), vec))
+    return pdus, source
+
+
+# ---------------- WIRING ----------------
+
+def connect(block, handler):
+    """Send everything `block` publishes straight to handler(port, msg)."""
+    block.message_port_pub = handler
+
+
+# build_* return (entry handler, block whose lost_packets counts the gaps)
+
+def build_chain(sink, pass_failed=False):
+    descrambler = CcsdsDescrambler(frame_len_bytes=FRAME_LEN)
+    rs = CcsdsRsDecoder(interleave=INTERLEAVE, pass_failed=pass_failed)
+    vcdu = VcduParser()
+    assembler = SpacePacketAssembler()
+    demux = ApidDemux()
+
+    connect(descrambler, lambda port, msg: rs._handle(msg))
+    connect(rs, lambda port, msg: vcdu._handle(msg))
+    connect(vcdu, lambda port, msg: assembler._handle(msg))
+    connect(assembler, lambda port, msg: demux._handle_msg(msg))
+    connect(demux, lambda port, msg: sink(pmt.symbol_to_string(port), msg))
+
+    return descrambler._handle, assembler
+
+
+def build_fused(sink, pass_failed=False):
+    fused = CaduToPackets(frame_len_bytes=FRAME_LEN, interleave=INTERLEAVE, pass_failed=pass_failed)
+    connect(fused, lambda port, msg: sink(pmt.symbol_to_string(port), msg))
+    return fused._handle, fused
+
+
+def run(build, pdus, pass_failed=False):
+    packets = []
+    entry, counter = build(lambda port, msg: packets.append((port, u8vector_to_numpy(pmt.cdr(msg)).tobytes())), pass_failed)
+
+    start = time.perf_counter()
+    for msg in pdus:
+        entry(msg)
+    elapsed = time.perf_counter() - start
+
+    return elapsed, packets, counter.lost_packets
+
+
+def check_packets(name, packets, lost_packets, source):
+    """
+    Every packet must be a packet of the source streams, on its APID's port,
+    in order per channel and APID, and lost_packets the number skipped between
+    the first and last one received.
+    """
+    spans = {}  # (vcid, apid) -> [first count, last count, received]
+    for port, data in packets:
+        found = source.get(data)
+        if found is None or APID_PORTS[found[1]] != port:
+            raise SystemExit(f"{name}: a packet on {port} is not a packet of the stream")
+
+        vcid, apid, count = found
+        span = spans.get((vcid, apid))
+        if span is None:
+            spans[(vcid, apid)] = [count, count, 1]
+        elif count <= span[1]:
+            raise SystemExit(f"{name}: APID {apid} packet {count} repeated or out of order")
+        else:
+            span[1] = count
+            span[2] += 1
+
+    expected = sum(last - first + 1 - received for first, last, received in spans.values())
+    if lost_packets != expected:
+        raise SystemExit(f"{name}: lost_packets {lost_packets}, {expected} packets missing")
+
+
+# ---------------- PER BLOCK ----------------
+
+def per_call(fn, args):
+    start = time.perf_counter()
+    for arg in args:
+        fn(arg)
+    return (time.perf_counter() - start) / max(1, len(args))
+
+
+def bench_blocks(pdus):
+    """Time each chain block's handler alone on the messages it gets in the chain."""
+    stages = [
+        ("CcsdsDescrambler", lambda: CcsdsDescrambler(frame_len_bytes=FRAME_LEN), "_handle"),
+        ("CcsdsRsDecoder", lambda: CcsdsRsDecoder(interleave=INTERLEAVE), "_handle"),
+        ("VcduParser", VcduParser, "_handle"),
+        ("SpacePacketAssembler", SpacePacketAssembler, "_handle"),
+        ("ApidDemux", ApidDemux, "_handle_msg"),
+    ]
+
+    messages = pdus
+    for name, make, handler in stages:
+        block = make()
+        received = []
+        connect(block, lambda port, msg: received.append(msg))
+        elapsed = per_call(getattr(block, handler), messages)
+        print(f"{name:22s} {elapsed * 1e6:9.1f} us/msg  ({len(messages)} msgs)")
+        messages = received
+
+    for size, what in ((FRAME_LEN * 8, "unpacked CADU"), (FRAME_LEN, "CADU"), (VCDU_LEN, "VCDU"), (1568, "image row"), (200, "short packet")):
+        data = np.random.default_rng(size).integers(0, 256, size, dtype=np.uint8)
+        vecs = [pmt.init_u8vector(size, data)] * 200
+        arrays = [data] * 200
+
+        to_list = per_call(lambda v: np.array(pmt.u8vector_elements(v), dtype=np.uint8), vecs)
+        to_numpy = per_call(u8vector_to_numpy, vecs)
+        from_list = per_call(lambda a: pmt.init_u8vector(len(a), list(a)), arrays)
+        from_numpy = per_call(numpy_to_u8vector, arrays)
+        print(f"{what:14s} {size:5d} B  to numpy {to_list * 1e6:7.1f} -> {to_numpy * 1e6:6.1f} us"
+              f"   from numpy {from_list * 1e6:7.1f} -> {from_numpy * 1e6:6.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per CADU cost of the CADU -> space packet blocks")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--errors", type=int, default=0, help="byte errors per CADU")
+    parser.add_argument("--drop", type=float, default=0.0, help="fraction of the CADUs left out")
+    parser.add_argument("--blocks", action="store_true", help="also time the blocks and PDU conversions one by one")
+    args = parser.parse_args()
+
+    pdus, source = make_cadus(args.frames, args.errors, drop=args.drop)
+
+    results = {}
+    for name, build in (("chain", build_chain), ("fused", build_fused)):
+        elapsed, packets, lost = run(build, pdus)
+        check_packets(name, packets, lost, source)
+        results[name] = packets
+        print(f"{name:6s} {elapsed / len(pdus) * 1e6:9.1f} us/CADU  {len(packets)} packets  {lost} lost")
+
+    if results["chain"] != results["fused"]:
+        raise SystemExit("chain and fused outputs differ")
+
+    failing, source = make_cadus(args.frames, FAILING_ERRORS, seed=1, vcids=(5, 6), drop=args.drop)
+    failing_results = {}
+    for pass_failed in (False, True):
+        _, chain, chain_lost = run(build_chain, failing, pass_failed)
+        _, fused, fused_lost = run(build_fused, failing, pass_failed)
+        check_packets("chain", chain, chain_lost, source)
+        check_packets("fused", fused, fused_lost, source)
+        if chain != fused:
+            raise SystemExit(f"chain and fused outputs differ with RS failures (pass_failed={pass_failed})")
+        failing_results[pass_failed] = chain
+        print(f"{FAILING_ERRORS} errors/CADU, pass_failed={pass_failed!s:5s}: same {len(chain)} packets  {chain_lost} lost")
+
+    if failing_results[False] != failing_results[True]:
+        raise SystemExit("pass_failed changes the packets")
+
+    if args.blocks:
+        bench_blocks(pdus)
+
+
+if __name__ == "__main__":
+    main()
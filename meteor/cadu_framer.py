@@ -3,24 +3,65 @@
 # cadu_framer.py - GNU Radio Python block (stream bits -> CADU bit-PDUs)
 #
 # Input:  stream of uint8 bits (0/1)
-# Output: message port 'cadu' with PMT PDU (u8vector) of length cadu_len_bits
+# Output: message port 'cadu' with PMT PDU (u8vector) of length cadu_len_bits,
+#         or cadu_len_bytes packed bytes with packed=True
+#         message port 'metrics' with a PMT dict {frame_lock, slip_count,
+#         frames, asm_errors} on every sync state change and every
+#         METRICS_EVERY frames
 #
 import numpy as np
 from gnuradio import gr
 import pmt
 
+from pdu import make_pdu
+
 
 class CaduFramer(gr.basic_block):
     """
     CADU framer:
       - input: stream of bits as unsigned char (0/1)
       - output: PDUs on message port 'cadu', each PDU is one CADU frame as UNPACKED BITS (0/1)
-      - behavior: shifter-based ASM search + automatic bit inversion (ASM or ~ASM)
+      - behavior: vectorized ASM search + automatic bit inversion (ASM or ~ASM)
       - output format: u8vector of bits (0/1), length = cadu_len_bytes*8
-      - meta: packet_len = number of items (bits)
+        with packed=True: u8vector of bytes (MSB first), length = cadu_len_bytes
+      - meta: packet_len = number of items (bits, or bytes when packed)
+
+    Frame sync is a search / verify / lock state machine:
+      - SEARCH: look for an exact ASM (or ~ASM) anywhere in the input
+      - VERIFY: the ASM must follow the next frames at the expected offset,
+        within asm_tolerance bit errors, verify_frames times in a row,
+        otherwise back to SEARCH
+      - LOCK:   the ASM is only checked at the expected offset (no search).
+        A marker with more than asm_tolerance bit errors counts as a miss,
+        the frame is still taken (flywheel); after miss_limit misses in a
+        row it is back to SEARCH
+
+    Extra meta per frame:
+      cadu.lock_state  SYNC_SEARCH / SYNC_VERIFY / SYNC_LOCK when the frame was taken
+      cadu.asm_errors  bit errors in the frame's ASM
+      cadu.inverted    1 if the frame was found with ~ASM
+      cadu.slip_count  number of times LOCK was lost so far (a candidate
+                       failing VERIFY is no slip)
+      cadu.offset      input stream item (bit) index of the frame's first bit
+
+    Every state change, including the drop back to SEARCH, and every
+    METRICS_EVERY frames the sync stats are published on 'metrics' as
+    {frame_lock, slip_count, frames (taken so far), asm_errors (of the last
+    frame)}, so the lock state is known while no frames come out and the
+    metrics need not look at the frames.
     """
 
-    def __init__(self, cadu_len_bytes=1024, cadu_asm=0x1ACFFC1D):
+    SYNC_SEARCH = 0
+    SYNC_VERIFY = 1
+    SYNC_LOCK = 2
+
+    # ASM search window, bounds the work done per numpy call
+    SEARCH_CHUNK = 4096
+
+    # frames between two 'metrics' messages (besides the state changes)
+    METRICS_EVERY = 4
+
+    def __init__(self, cadu_len_bytes=1024, cadu_asm=0x1ACFFC1D, verify_frames=2, asm_tolerance=4, miss_limit=3, packed=False):
         gr.basic_block.__init__(
             self,
             name="cadu_framer",
@@ -30,61 +71,189 @@ class CaduFramer(gr.basic_block):
 
         self.cadu_len_bytes = int(cadu_len_bytes)
         self.cadu_size_bits = self.cadu_len_bytes * 8
+        self.packed = bool(packed)
 
         self.CADU_ASM = int(cadu_asm) & 0xFFFFFFFF
         self.CADU_ASM_INV = (~self.CADU_ASM) & 0xFFFFFFFF
 
-        self._shifter = 0
+        self.verify_frames = max(0, int(verify_frames))
+        self.asm_tolerance = max(0, int(asm_tolerance))
+        self.miss_limit = max(1, int(miss_limit))
+
+        self._asm_bits = np.unpackbits(
+            np.frombuffer(self.CADU_ASM.to_bytes(4, "big"), dtype=np.uint8)
+        )
+
+        # the 31 bits before the unprocessed input plus the unprocessed input
+        # (an incomplete ASM), so an ASM straddling two work calls is found;
+        # starts as zeros like the original 32-bit shifter did
+        self._history = np.zeros(31, dtype=np.uint8)
+
+        self._state = self.SYNC_SEARCH
+        self._verified = 0
+        self._misses = 0
+        self.slip_count = 0
+        self.frames = 0
+
         self._in_frame = False
         self._bit_inversion = 0
         self._bit_of_frame = 0
+        self._frame_state = self.SYNC_SEARCH
+        self._frame_asm_errors = 0
+        self._frame_offset = 0
 
-        # store bits as 0/1 (bytearray is fine)
-        self._bits = bytearray(self.cadu_size_bits)
+        # store bits as 0/1
+        self._bits = np.zeros(self.cadu_size_bits, dtype=np.uint8)
 
         self._port = pmt.intern("cadu")
         self.message_port_register_out(self._port)
+        self._metrics_port = pmt.intern("metrics")
+        self.message_port_register_out(self._metrics_port)
 
-    def _reset_frame(self):
-        self._bit_of_frame = 0
-        # no need to clear the whole buffer every time; we'll overwrite sequentially
+    def lock_state(self):
+        return self._state
+
+    def _set_state(self, state):
+        if state == self._state:
+            return
+        self._state = state
+        self._publish_metrics()
 
-    def _write_bit(self, b):
-        # store unpacked bit (0 or 1)
-        self._bits[self._bit_of_frame] = int(b) & 1
-        self._bit_of_frame += 1
+    def _publish_metrics(self):
+        metrics = pmt.make_dict()
+        metrics = pmt.dict_add(metrics, pmt.intern("frame_lock"), pmt.from_long(self._state))
+        metrics = pmt.dict_add(metrics, pmt.intern("slip_count"), pmt.from_long(self.slip_count))
+        metrics = pmt.dict_add(metrics, pmt.intern("frames"), pmt.from_long(self.frames))
+        metrics = pmt.dict_add(metrics, pmt.intern("asm_errors"), pmt.from_long(self._frame_asm_errors))
+        self.message_port_pub(self._metrics_port, metrics)
 
     def _emit_frame(self):
-        vec = pmt.init_u8vector(self.cadu_size_bits, list(self._bits))
+        data = np.packbits(self._bits) if self.packed else self._bits
+        packet_len = len(data)
 
         meta = pmt.make_dict()
-        meta = pmt.dict_add(meta, pmt.intern("packet_len"), pmt.from_long(self.cadu_size_bits))
+        meta = pmt.dict_add(meta, pmt.intern("packet_len"), pmt.from_long(packet_len))
+        meta = pmt.dict_add(meta, pmt.intern("cadu.lock_state"), pmt.from_long(self._frame_state))
+        meta = pmt.dict_add(meta, pmt.intern("cadu.asm_errors"), pmt.from_long(self._frame_asm_errors))
+        meta = pmt.dict_add(meta, pmt.intern("cadu.inverted"), pmt.from_long(self._bit_inversion))
+        meta = pmt.dict_add(meta, pmt.intern("cadu.slip_count"), pmt.from_long(self.slip_count))
+        meta = pmt.dict_add(meta, pmt.intern("cadu.offset"), pmt.from_long(self._frame_offset))
+
+        self.message_port_pub(self._port, make_pdu(meta, data))
+
+        self.frames += 1
+        if self.frames % self.METRICS_EVERY == 0:
+            self._publish_metrics()
 
-        msg = pmt.cons(meta, vec)
-        self.message_port_pub(self._port, msg)
+    def _find_asm(self, buf, pos):
+        """
+        Search for ASM / ~ASM ending at or after bit `pos` of buf.
+
+        Returns (index of the first bit after the marker, inverted) or None.
+        Windows are compared all at once, a chunk at a time.
+        """
+        n = len(buf)
+        while pos < n:
+            end = min(n, pos + self.SEARCH_CHUNK)
+            windows = np.lib.stride_tricks.sliding_window_view(buf[pos - 31:end], 32)
+
+            # number of bits differing from the ASM: 0 = ASM, 32 = inverted ASM
+            distance = np.count_nonzero(windows != self._asm_bits, axis=1)
+            hits = np.flatnonzero((distance == 0) | (distance == 32))
+            if len(hits) > 0:
+                k = int(hits[0])
+                return pos + k + 1, 1 if distance[k] == 32 else 0
+
+            pos = end
+        return None
+
+    def _lose_sync(self):
+        self._verified = 0
+        self._misses = 0
+        if self._state == self.SYNC_LOCK:
+            self.slip_count += 1
+        self._set_state(self.SYNC_SEARCH)
+
+    def _check_asm(self, marker):
+        """
+        VERIFY / LOCK: check the 32 bits where the next ASM should be.
+        Returns True if a frame should be taken after them.
+        """
+        errors = int(np.count_nonzero(marker != self._asm_bits))
+
+        if errors <= self.asm_tolerance:
+            inversion, ok = 0, True
+        elif 32 - errors <= self.asm_tolerance:
+            inversion, ok, errors = 1, True, 32 - errors
+        else:
+            inversion, ok, errors = self._bit_inversion, False, min(errors, 32 - errors)
+
+        if ok:
+            self._misses = 0
+            if self._state == self.SYNC_VERIFY:
+                self._verified += 1
+                if self._verified >= self.verify_frames:
+                    self._set_state(self.SYNC_LOCK)
+        else:
+            if self._state == self.SYNC_VERIFY:
+                self._lose_sync()
+                return False
+
+            self._misses += 1
+            if self._misses >= self.miss_limit:
+                self._lose_sync()
+                return False
+
+        self._bit_inversion = inversion
+        self._frame_asm_errors = errors
+        return True
 
     def general_work(self, input_items, output_items):
         in0 = input_items[0]
 
-        for b in in0:
-            bit = int(b) & 1
-            self._shifter = ((self._shifter << 1) & 0xFFFFFFFF) | bit
+        # pos is the next bit to process, there are always 31 bits before it
+        buf = np.concatenate((self._history, in0 & 1))
+        base = self.nitems_read(0) - len(self._history)  # stream index of buf[0]
+        pos = 31
 
+        while pos < len(buf):
             if self._in_frame:
-                self._write_bit(bit ^ self._bit_inversion)
+                take = min(self.cadu_size_bits - self._bit_of_frame, len(buf) - pos)
+                frame_end = self._bit_of_frame + take
+                self._bits[self._bit_of_frame:frame_end] = buf[pos:pos + take] ^ self._bit_inversion
+                self._bit_of_frame = frame_end
+                pos += take
+
                 if self._bit_of_frame == self.cadu_size_bits:
                     self._emit_frame()
                     self._in_frame = False
                 continue
 
-            if self._shifter == self.CADU_ASM:
-                self._bit_inversion = 0
-                self._reset_frame()
-                self._in_frame = True
-            elif self._shifter == self.CADU_ASM_INV:
-                self._bit_inversion = 1
-                self._reset_frame()
-                self._in_frame = True
+            if self._state == self.SYNC_SEARCH:
+                found = self._find_asm(buf, pos)
+                if found is None:
+                    pos = len(buf)
+                    break
+
+                pos, self._bit_inversion = found
+                self._frame_asm_errors = 0
+                self._set_state(self.SYNC_LOCK if self.verify_frames == 0 else self.SYNC_VERIFY)
+            else:
+                # the next ASM is expected right here, wait until all of it is in
+                if len(buf) - pos < 32:
+                    break
+
+                if not self._check_asm(buf[pos:pos + 32]):
+                    continue  # back in SEARCH, from this position
+
+                pos += 32
+
+            self._frame_state = self._state
+            self._frame_offset = base + pos
+            self._bit_of_frame = 0
+            self._in_frame = True
+
+        self._history = buf[pos - 31:].copy()
 
         self.consume_each(len(in0))
         return 0
\ No newline at end of file
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+#
+# cadu_to_packets.py - GNU Radio PDU block (framed CADUs -> space packets per APID)
+#
+# Input:  message port 'in', CADU PDUs from CaduFramer (packed bytes or unpacked bits)
+# Output: one message port per APID (see APID_PORTS), space packet data fields
+#         with the same metadata the separate blocks would have added
+#
+import numpy as np
+import pmt
+from gnuradio import gr
+
+from apid_demux import APID_PORTS
+from ccsds_descrambler import ccsds_pn_sequence
+from ccsds_rs_decoder import rs_meta
+from pdu import make_pdu, pdu_to_numpy
+from reed_solomon import NN, decode_interleaved
+from space_packet_assembler import PacketReassembler, space_packet_meta
+from vcdu_parser import VCDU_PRIMARY_HEADER_LEN, VcduCounterTracker, parse_vcdu_header, track_vcdu_header, vcdu_meta
+
+
+class CaduToPackets(gr.basic_block):
+    """
+    Fused CcsdsDescrambler -> CcsdsRsDecoder -> VcduParser ->
+    SpacePacketAssembler -> ApidDemux chain.
+
+    One handler call per CADU does all the steps on the frame's numpy buffer,
+    only the finished space packets are turned back into PMTs. Packets of
+    APIDs without a port are dropped, like ApidDemux does by default.
+
+    An uncorrectable CADU is dropped (counted in rs_failed); the next frame
+    of its virtual channel shows the counter gap and drops that channel's
+    partial packet. pass_failed is only kept for parity with
+    CcsdsRsDecoder, whose tagged frames the chain ignores the same way, so
+    it does not change the packets.
+    """
+
+    def __init__(self, frame_len_bytes=1020, interleave=4, pass_failed=False):
+        gr.basic_block.__init__(self, name="cadu_to_packets", in_sig=None, out_sig=None)
+
+        self.frame_len_bytes = int(frame_len_bytes)
+        self.interleave = int(interleave)
+        self.pass_failed = bool(pass_failed)
+        if self.frame_len_bytes != NN * self.interleave:
+            raise ValueError(f"frame_len_bytes must be {NN} * interleave")
+
+        self._pn = ccsds_pn_sequence(self.frame_len_bytes)
+        self._tracker = VcduCounterTracker()
+        self._reassemblers = {}  # virtual channel id -> PacketReassembler
+
+        self.frames = 0
+        self.rs_failed = 0
+
+        self._ports = {apid: pmt.intern(name) for apid, name in APID_PORTS.items()}
+        for port in self._ports.values():
+            self.message_port_register_out(port)
+
+        self.message_port_register_in(pmt.intern("in"))
+        self.set_msg_handler(pmt.intern("in"), self._handle)
+
+    def set_pass_failed(self, pass_failed):
+        self.pass_failed = bool(pass_failed)
+
+    @property
+    def lost_frames(self):
+        return self._tracker.lost_frames
+
+    @property
+    def lost_packets(self):
+        return sum(r.lost_packets for r in self._reassemblers.values())
+
+    def _handle(self, msg):
+        meta, data = pdu_to_numpy(msg)
+
+        # descramble
+        if len(data) == 8 * self.frame_len_bytes:
+            data = np.packbits(data & 1)
+        elif len(data) != self.frame_len_bytes:
+            self.logger.error(f"CADU length {len(data)}, expected {self.frame_len_bytes} bytes")
+            return
+        data = data ^ self._pn
+
+        # RS
+        self.frames += 1
+        vcdu, corrected = decode_interleaved(data, self.interleave)
+        if vcdu is None:
+            self.rs_failed += 1
+            return
+
+        # VCDU header (counter gap: drop the partial packet), MPDU -> packets
+        vcdu = vcdu.tobytes()
+        vcdu_header = track_vcdu_header(self._tracker, parse_vcdu_header(vcdu))
+        vcid = vcdu_header["virtual_channel_id"]
+
+        reassembler = self._reassemblers.get(vcid)
+        if reassembler is None:
+            reassembler = self._reassemblers[vcid] = PacketReassembler(logger=self.logger)
+        if vcdu_header["lost_frames"] != 0:
+            reassembler.reset()
+
+        packets = reassembler.push(vcdu[VCDU_PRIMARY_HEADER_LEN:])
+        if not packets:
+            return
+
+        meta = rs_meta(meta, corrected)
+        meta = vcdu_meta(meta, vcdu_header)
+
+        for header, payload in packets:
+            port = self._ports.get(header["apid"])
+            if port is None:
+                continue
+
+            self.message_port_pub(port, make_pdu(space_packet_meta(meta, header), payload))
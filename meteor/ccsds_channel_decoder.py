@@ -51,8 +51,6 @@ from gnuradio.filter import firdes
 from gnuradio.fft import window
 import signal
 from viterbi import Viterbi  # grc-generated hier_block
-import satellites
-import satellites.hier
 import threading
 
 
@@ -62,13 +60,19 @@ import threading
 
 
 class ccsds_channel_decoder(gr.hier_block2):
-    def __init__(self):
+    def __init__(self, viterbi_decoder='gr-fec'):
         gr.hier_block2.__init__(
             self, "CCSDS Channel Decoder",
                 gr.io_signature(1, 1, gr.sizeof_float*1),
-                gr.io_signature(1, 1, gr.sizeof_float*1),
+                gr.io_signature(0, 0, 0),
         )
-        self.message_port_register_hier_out("cadus")
+        self.message_port_register_hier_out("frames")
+        self.message_port_register_hier_out("metrics")
+
+        ##################################################
+        # Parameters
+        ##################################################
+        self.viterbi_decoder = viterbi_decoder
 
         ##################################################
         # Variables
@@ -79,28 +83,35 @@ class ccsds_channel_decoder(gr.hier_block2):
         # Blocks
         ##################################################
 
-        self.viterbi_0 = Viterbi()
-        self.satellites_decode_rs_ccsds_0 = satellites.decode_rs(False, 4)
-        self.satellites_ccsds_descrambler_0 = satellites.hier.ccsds_descrambler()
+        self.viterbi_0 = Viterbi(decoder=viterbi_decoder, traceback_depth=64, chunk=4096)
         self.digital_diff_decoder_bb_0 = digital.diff_decoder_bb(2, digital.DIFF_DIFFERENTIAL)
         self.cadu_framer_0 = CaduFramer(
             cadu_len_bytes=1020,
             cadu_asm=0x1ACFFC1D,
+            verify_frames=2,
+            asm_tolerance=4,
+            miss_limit=3,
+            packed=True,
         )
 
 
         ##################################################
         # Connections
         ##################################################
-        self.msg_connect((self.cadu_framer_0, 'cadu'), (self.satellites_ccsds_descrambler_0, 'in'))
-        self.msg_connect((self.satellites_ccsds_descrambler_0, 'out'), (self.satellites_decode_rs_ccsds_0, 'in'))
-        self.msg_connect((self.satellites_decode_rs_ccsds_0, 'out'), (self, 'cadus'))
+        self.msg_connect((self.cadu_framer_0, 'cadu'), (self, 'frames'))
+        self.msg_connect((self.cadu_framer_0, 'metrics'), (self, 'metrics'))
+        self.msg_connect((self.viterbi_0, 'ber'), (self, 'metrics'))
         self.connect((self.digital_diff_decoder_bb_0, 0), (self.cadu_framer_0, 0))
         self.connect((self, 0), (self.viterbi_0, 0))
         self.connect((self.viterbi_0, 0), (self.digital_diff_decoder_bb_0, 0))
-        self.connect((self.viterbi_0, 1), (self, 0))
 
 
+    def get_viterbi_decoder(self):
+        return self.viterbi_decoder
+
+    def set_viterbi_decoder(self, viterbi_decoder):
+        self.viterbi_decoder = viterbi_decoder
+
     def get_samp_rate(self):
         return self.samp_rate
 
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#
+# ccsds_descrambler.py - GNU Radio PDU block (scrambled CADU bytes -> descrambled CADU bytes)
+#
+# Input:  PDU (u8vector), one CADU without the ASM, either packed bytes or
+#         unpacked bits (0/1, frame_len_bytes * 8 of them)
+# Output: PDU (u8vector) of packed bytes XOR-ed with the CCSDS pseudo-random sequence
+#
+from functools import lru_cache
+
+import numpy as np
+import pmt
+from gnuradio import gr
+
+from pdu import make_pdu, pdu_to_numpy
+
+
+@lru_cache(maxsize=4)
+def ccsds_pn_sequence(n_bytes):
+    """
+    CCSDS pseudo-randomizer sequence, h(x) = x^8 + x^7 + x^5 + x^3 + 1 seeded
+    with all ones (starts ff 48 0e c0 9a ...). Returns n_bytes packed MSB-first,
+    read-only (the array is shared between callers).
+    """
+    state = 0xFF
+    out = np.empty(n_bytes, dtype=np.uint8)
+
+    for i in range(n_bytes):
+        byte = 0
+        for _ in range(8):
+            byte = (byte << 1) | (state & 1)
+            feedback = (state ^ (state >> 3) ^ (state >> 5) ^ (state >> 7)) & 1
+            state = (state >> 1) | (feedback << 7)
+        out[i] = byte
+
+    out.setflags(write=False)
+    return out
+
+
+class CcsdsDescrambler(gr.basic_block):
+    """
+    Descrambles CADU PDUs from CaduFramer, packed=True (bytes) or
+    packed=False (unpacked bits, like gr-satellites' ccsds_descrambler takes).
+    The output is always packed bytes, ready for the RS decoder.
+
+    The PN sequence is computed once for frame_len_bytes, descrambling a
+    frame is a single XOR over the whole buffer (after packing the bits of
+    an unpacked frame).
+    """
+
+    def __init__(self, frame_len_bytes=1020):
+        gr.basic_block.__init__(self, name="ccsds_descrambler", in_sig=None, out_sig=None)
+
+        self.frame_len_bytes = int(frame_len_bytes)
+        self._pn = ccsds_pn_sequence(self.frame_len_bytes)
+
+        self.message_port_register_in(pmt.intern("in"))
+        self.message_port_register_out(pmt.intern("out"))
+        self.set_msg_handler(pmt.intern("in"), self._handle)
+
+    def _handle(self, msg):
+        meta, data = pdu_to_numpy(msg)
+
+        if len(data) == 8 * self.frame_len_bytes:
+            data = np.packbits(data & 1)
+        elif len(data) > self.frame_len_bytes:
+            self.logger.error(f"CADU too long: {len(data)} bytes (max {self.frame_len_bytes})")
+            return
+
+        data = data ^ self._pn[:len(data)]
+
+        meta = pmt.dict_add(meta, pmt.intern("packet_len"), pmt.from_long(len(data)))
+        self.message_port_pub(pmt.intern("out"), make_pdu(meta, data))
@@ -1,9 +1,11 @@
+import numpy as np
 from gnuradio import gr
 import pmt
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Optional
 
-from decode_jpeg import decode_14_blocks
+from decode_jpeg import decode_14_blocks, decode_14_blocks_dc
+from pdu import make_pdu, meta_long, u8vector_to_numpy
 
 
 # ---------------- CONSTANTS ----------------
@@ -13,6 +15,10 @@ BLOCK_WIDTH = 8 * 14          # 112
 BLOCK_HEIGHT = 8
 IMAGE_WIDTH = BLOCKS_PER_LINE * BLOCK_WIDTH  # 1568
 
+# preview mode: one pixel per 8x8 block
+PREVIEW_BLOCK_WIDTH = 14
+PREVIEW_WIDTH = BLOCKS_PER_LINE * PREVIEW_BLOCK_WIDTH  # 196
+
 
 
 @dataclass
@@ -42,46 +48,75 @@ class CcsdsImageDecoder(gr.basic_block):
     """
     Input:  message port "in"  (u8vector CCSDS space packet)
     Output: message port "out" (u8vector, one image row per message)
+
+    With preview=True only the DC coefficients are decoded and every image
+    line becomes a single PREVIEW_WIDTH (196) pixel row, a 1/8 scale thumbnail.
+
+    Blocks of missing packets stay black; a line is emitted as soon as a
+    packet of the next line arrives, also when the end of the line was lost.
+    space_packet.lost_packets (SpacePacketAssembler / CaduToPackets) tells
+    how many packets of the APID are missing before a packet, so a loss of
+    whole lines is emitted as that many black lines.
     """
 
-    def __init__(self):
+    def __init__(self, preview=False):
         gr.basic_block.__init__(self, name="ccsds_image_decoder", in_sig=[], out_sig=[])
 
-        self.current_line: Optional[List[List[int]]] = None
+        self.preview = bool(preview)
+        self.current_line: Optional[np.ndarray] = None  # (BLOCK_HEIGHT, IMAGE_WIDTH) uint8, (1, PREVIEW_WIDTH) in preview
+        self._last_index = -1  # packet index in current_line of the last packet
 
         self.message_port_register_in(pmt.intern("in"))
         self.message_port_register_out(pmt.intern("out"))
         self.set_msg_handler(pmt.intern("in"), self._handle_msg)
 
     def _handle_msg(self, msg):
-        data = pmt.cdr(msg) 
-        payload = bytes(pmt.u8vector_elements(data))
-        self._process_packet(payload)
+        lost = meta_long(pmt.car(msg), "space_packet.lost_packets")
+        payload = u8vector_to_numpy(pmt.cdr(msg)).tobytes()
+        self._process_packet(payload, lost)
 
-    def _emit_rows(self, rows: List[List[int]]):
+    def _emit_rows(self, rows: np.ndarray):
         for row in rows:
-            vec = pmt.init_u8vector(len(row), row)
-            out_msg = pmt.cons(pmt.PMT_NIL, vec)
-            self.message_port_pub(pmt.intern("out"), out_msg)
+            self.message_port_pub(pmt.intern("out"), make_pdu(pmt.PMT_NIL, row))
 
-    def _process_packet(self, payload: bytes):
-        seg = parse_segment(payload)
+    def _blank_line(self) -> np.ndarray:
+        if self.preview:
+            return np.zeros((1, PREVIEW_WIDTH), dtype=np.uint8)
+        return np.zeros((BLOCK_HEIGHT, IMAGE_WIDTH), dtype=np.uint8)
 
-        pixels_8x112 = decode_14_blocks(seg.payload, seg.QF)
+    def _process_packet(self, payload: bytes, lost: int = 0):
+        seg = parse_segment(payload)
 
         packet_idx_in_line = seg.MCUN // 14
-        x0 = packet_idx_in_line * BLOCK_WIDTH
 
-        # New line but previous incomplete → flush
-        if packet_idx_in_line == 0 and self.current_line is not None:
+        # lost packets that reach past the end of the last line: finish it and
+        # add a black line for every line lost entirely (only if the packet
+        # index agrees with the loss, otherwise the check below decides)
+        position = self._last_index + 1 + lost  # packets since the start of the last line
+        if (lost > 0 and position >= BLOCKS_PER_LINE
+                and position % BLOCKS_PER_LINE == packet_idx_in_line):
+            if self.current_line is not None:
+                self._emit_rows(self.current_line)
+                self.current_line = None
+            for _ in range(position // BLOCKS_PER_LINE - 1):
+                self._emit_rows(self._blank_line())
+
+        # New line but previous incomplete → flush (the index only grows
+        # within a line, packets of the next line may have been lost too)
+        if self.current_line is not None and packet_idx_in_line <= self._last_index:
             self._emit_rows(self.current_line)
             self.current_line = None
+        self._last_index = packet_idx_in_line
 
+        # decodes straight into the line buffer
         if self.current_line is None:
-            self.current_line = [[0] * IMAGE_WIDTH for _ in range(BLOCK_HEIGHT)]
-
-        for r in range(BLOCK_HEIGHT):
-            self.current_line[r][x0:x0 + BLOCK_WIDTH] = pixels_8x112[r]
+            self.current_line = self._blank_line()
+        if self.preview:
+            x0 = packet_idx_in_line * PREVIEW_BLOCK_WIDTH
+            decode_14_blocks_dc(seg.payload, seg.QF, out=self.current_line[0], x0=x0)
+        else:
+            x0 = packet_idx_in_line * BLOCK_WIDTH
+            decode_14_blocks(seg.payload, seg.QF, out=self.current_line, x0=x0)
 
         # End of line
         if packet_idx_in_line == (BLOCKS_PER_LINE - 1):
@@ -1,10 +1,18 @@
+import numpy as np
 from gnuradio import gr
 import pmt
 from pathlib import Path
 from dataclasses import dataclass
-from typing import List, Optional, Dict
+from typing import Optional, Dict, Deque, Tuple
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+import threading
 from PIL import Image
-from decode_jpeg import decode_14_blocks
+import decode_jpeg
+from decode_jpeg import decode_14_blocks, decode_14_blocks_dc
+from pdu import make_pdu, meta_long, u8vector_to_numpy
+from raw_dump import RawDumpWriter
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 
@@ -16,15 +24,12 @@ BLOCK_WIDTH = 8 * 14
 BLOCK_HEIGHT = 8
 IMAGE_WIDTH = BLOCKS_PER_LINE * BLOCK_WIDTH
 
+# preview mode: one pixel per 8x8 block
+PREVIEW_BLOCK_WIDTH = 14
+PREVIEW_WIDTH = BLOCKS_PER_LINE * PREVIEW_BLOCK_WIDTH
 
-# ---------------- DATA STRUCTURES ----------------
-
-@dataclass
-class Channel:
-    apid: int
-    big_rows: List[List[int]]
-    current_line: Optional[List[List[int]]]
 
+# ---------------- DATA STRUCTURES ----------------
 
 # ---------------- MAIN BLOCK ----------------
 
@@ -57,11 +62,46 @@ class Segment:
     QF: int                    # uint8_t
     payload: bytes
 
+class ChannelCanvas:
+    """
+    A channel's image as one uint8 array, grown chunk_lines image lines at a
+    time (and by half its size once it is big, so growing stays cheap).
+    Segments are decoded straight into the line returned by start_line().
+    """
+
+    def __init__(self, line_height: int, width: int, chunk_lines: int = 256):
+        self.line_height = line_height
+        self.width = width
+        self.chunk_lines = chunk_lines
+
+        self._pixels = np.zeros((chunk_lines * line_height, width), dtype=np.uint8)
+        self.lines = 0  # finished lines
+
+    def start_line(self) -> np.ndarray:
+        """View of the next line, (line_height, width), all zeros."""
+        end = (self.lines + 1) * self.line_height
+        if end > len(self._pixels):
+            grow = max(self.chunk_lines * self.line_height, len(self._pixels) // 2)
+            pixels = np.zeros((len(self._pixels) + grow, self.width), dtype=np.uint8)
+            pixels[:len(self._pixels)] = self._pixels
+            self._pixels = pixels
+        return self._pixels[end - self.line_height:end]
+
+    def finish_line(self):
+        self.lines += 1
+
+    def pixels(self) -> np.ndarray:
+        """View of the finished lines, (lines * line_height, width)."""
+        return self._pixels[:self.lines * self.line_height]
+
+
 @dataclass
 class Channel:
     apid: int
-    big_rows: List[List[int]]
-    current_line: int
+    # finished lines, (BLOCK_HEIGHT, IMAGE_WIDTH) each, (1, PREVIEW_WIDTH) in preview
+    canvas: ChannelCanvas
+    current_line: Optional[np.ndarray]     # view of the line being decoded, in canvas
+    last_index: int = -1                   # packet index in current_line of the last segment
 
 
 
@@ -145,10 +185,60 @@ def parse_space_packet(data):
     )
 
 class CcsdsImageSink(gr.basic_block):
-
-    def __init__(self, out_dir: str = "output"):
+    """
+    Decodes MSU-MR image packets per APID and writes PNGs into out_dir on stop.
+
+    With preview=True only the DC coefficients are decoded (1/8 scale,
+    PREVIEW_WIDTH pixels per line) and the files get a _preview suffix.
+
+    Missing blocks stay black. space_packet.lost_packets (set by
+    SpacePacketAssembler / CaduToPackets) turns whole lost lines into as
+    many black lines, so the channels stay aligned.
+
+    With workers > 0 segments are decoded on a process pool instead of the
+    message handler thread. Results are put into the image in arrival order,
+    so the output is the same, by a collector thread that each finished
+    decode wakes up (so lines come out also while no packets arrive). At
+    most max_pending segments can be in flight; when the workers fall
+    behind further packets are dropped and counted in `dropped`.
+
+    Packet payloads are also appended to {apid}.bin in out_dir through a
+    buffered RawDumpWriter, flushed every dump_flush_interval seconds (by a
+    timer, also while no packets come in) and on stop; dump_index=True adds
+    {apid}.idx (offset, length, MCUN, timestamp per packet, and a #gap line
+    for data written earlier without index, see raw_dump).
+    """
+
+    def __init__(
+        self,
+        out_dir: str = "output",
+        preview: bool = False,
+        workers: int = 0,
+        max_pending: int = 256,
+        dump_index: bool = False,
+        dump_flush_interval: float = 5.0,
+    ):
         gr.basic_block.__init__(self, name="ccsds_image_sink", in_sig=[], out_sig=[])
 
+        self.preview = bool(preview)
+        self.max_pending = max(1, int(max_pending))
+        self.dropped = 0
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Deque[Tuple[int, Segment, int, Future]] = deque()
+        # _pending and the canvases are shared by the handler and the collector
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._stopping = False
+        self._collector: Optional[threading.Thread] = None
+        if int(workers) > 0:
+            # spawn, not fork: the flowgraph process is heavily threaded
+            self._pool = ProcessPoolExecutor(
+                max_workers=int(workers),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=decode_jpeg.init_worker,
+            )
+
         self.message_port_register_in(pmt.intern("in"))
         self.message_port_register_out(pmt.intern("img_out"))
 
@@ -157,6 +247,9 @@ class CcsdsImageSink(gr.basic_block):
         self.out_dir = Path(out_dir)
         self.out_dir.mkdir(parents=True, exist_ok=True)
 
+        self._dump = RawDumpWriter(
+            self.out_dir, flush_interval=dump_flush_interval, index=dump_index)
+
         self.apid_to_channel: Dict[int, Channel] = {}
 
     # ---------------- MESSAGE HANDLER ----------------
@@ -165,85 +258,180 @@ class CcsdsImageSink(gr.basic_block):
         meta = pmt.car(msg)
         data = pmt.cdr(msg)
 
-        payload = bytes(pmt.u8vector_elements(data))
+        # packets of this APID missing before this one (sequence count gap)
+        lost = meta_long(meta, "space_packet.lost_packets")
+
+        payload = u8vector_to_numpy(data).tobytes()
 
         space_packet = parse_space_packet(payload)
-        self.process_packet(space_packet)
+        self.process_packet(space_packet, lost)
 
     # ---------------- PACKET PROCESSING ----------------
 
-    def process_packet(self, space_packet:SpacePacket):
+    def process_packet(self, space_packet:SpacePacket, lost: int = 0):
         apid = space_packet.header.apid
         payload = space_packet.payload
 
         if apid == 70:
             return
 
+        segment = None
         if 60 <= apid < 70:
-
-            channel = self.apid_to_channel.get(apid)
-            if channel is None:
-                channel = Channel(apid=apid, big_rows=[], current_line=None)
-                self.apid_to_channel[apid] = channel
-
             segment = parse_segment(payload)
-            pixels = decode_14_blocks(segment.payload, segment.QF)
-
-            packet_idx_in_line = segment.MCUN // 14
-            x0 = packet_idx_in_line * BLOCK_WIDTH
 
-            # If new line starts but previous wasn't complete → flush partial
-            if packet_idx_in_line == 0 and channel.current_line is not None:
-                channel.big_rows.extend(channel.current_line)
-                if apid == 64:
-                    # flatten 8 rows
-                    flat = [
-                        pixel
-                        for row in channel.current_line
-                        for pixel in row
-                    ]
-
-                    vec = pmt.init_u8vector(len(flat), flat)
-                    msg = pmt.cons(pmt.PMT_NIL, vec)
-
-                    self.message_port_pub(pmt.intern("img_out"), msg)
-                channel.current_line = None
-
-            if channel.current_line is None:
-                channel.current_line = [
-                    [0] * IMAGE_WIDTH for _ in range(BLOCK_HEIGHT)
-                ]
-
-            for row in range(BLOCK_HEIGHT):
-                channel.current_line[row][x0:x0 + BLOCK_WIDTH] = pixels[row]
-
-            if packet_idx_in_line == BLOCKS_PER_LINE - 1:
-                channel.big_rows.extend(channel.current_line)
-                if apid == 64:
-                    for row in channel.current_line:
-                        vec = pmt.init_u8vector(len(row), row)
-                        msg = pmt.cons(pmt.PMT_NIL, vec)
-                        self.message_port_pub(pmt.intern("img_out"), msg)
-                channel.current_line = None
+            if self._pool is None:
+                self._place_segment(apid, segment, lost=lost)
+            else:
+                self._submit_segment(apid, segment, lost)
 
         # Raw dump
-        out_path = self.out_dir / f"{apid}.bin"
-        with out_path.open("ab") as f:
-            f.write(payload)
+        if segment is None:
+            self._dump.write(apid, payload)
+        else:
+            self._dump.write(apid, payload, segment.MCUN, segment.timestamp)
+
+    def _finish_line(self, channel: Channel):
+        channel.canvas.finish_line()
+        if channel.apid == 64:
+            for row in channel.current_line:
+                self.message_port_pub(pmt.intern("img_out"), make_pdu(pmt.PMT_NIL, row))
+        channel.current_line = None
+
+    def _place_segment(
+        self, apid: int, segment: Segment, pixels: Optional[np.ndarray] = None, lost: int = 0
+    ):
+        # pixels is the already decoded strip (worker pool), or None to decode here;
+        # lost is the number of packets of the APID missing before this one
+        channel = self.apid_to_channel.get(apid)
+        if channel is None:
+            channel = Channel(apid=apid, canvas=self._new_canvas(), current_line=None)
+            self.apid_to_channel[apid] = channel
+
+        packet_idx_in_line = segment.MCUN // 14
+
+        # lost packets that reach past the end of the last line: finish it and
+        # leave a black line for every line lost entirely (only if the packet
+        # index agrees with the loss, otherwise the check below decides)
+        position = channel.last_index + 1 + lost  # packets since the start of the last line
+        if (lost > 0 and position >= BLOCKS_PER_LINE
+                and position % BLOCKS_PER_LINE == packet_idx_in_line):
+            if channel.current_line is not None:
+                self._finish_line(channel)
+            for _ in range(position // BLOCKS_PER_LINE - 1):
+                channel.current_line = channel.canvas.start_line()
+                self._finish_line(channel)
+
+        # If new line starts but previous wasn't complete → flush partial
+        # (the index only grows within a line, the next line's first
+        # packets may have been lost too); missing blocks stay black
+        if channel.current_line is not None and packet_idx_in_line <= channel.last_index:
+            channel.canvas.finish_line()
+            if apid == 64:
+                # flatten 8 rows
+                flat = channel.current_line.reshape(-1)
+
+                self.message_port_pub(pmt.intern("img_out"), make_pdu(pmt.PMT_NIL, flat))
+            channel.current_line = None
+
+        if channel.current_line is None:
+            channel.current_line = channel.canvas.start_line()
+        channel.last_index = packet_idx_in_line
+
+        if pixels is None:
+            self._decode_segment(segment, channel.current_line, packet_idx_in_line)
+        elif self.preview:
+            x0 = packet_idx_in_line * PREVIEW_BLOCK_WIDTH
+            channel.current_line[0, x0:x0 + PREVIEW_BLOCK_WIDTH] = pixels
+        else:
+            x0 = packet_idx_in_line * BLOCK_WIDTH
+            channel.current_line[:, x0:x0 + BLOCK_WIDTH] = pixels
+
+        if packet_idx_in_line == BLOCKS_PER_LINE - 1:
+            self._finish_line(channel)
+
+    # ---------------- WORKER POOL ----------------
+
+    def _submit_segment(self, apid: int, segment: Segment, lost: int = 0):
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 100 == 0:
+                    self.logger.warn(
+                        f"decoder workers fall behind, dropped {self.dropped} segments so far")
+                return
+
+            future = self._pool.submit(
+                decode_jpeg.decode_segment, segment.payload, segment.QF, self.preview)
+            self._pending.append((apid, segment, lost, future))
+        future.add_done_callback(lambda _: self._done.set())
+
+    def _drain_pending(self, wait: bool):
+        # strictly in submission order, so lines are assembled the same way as inline
+        with self._lock:
+            while self._pending and (wait or self._pending[0][-1].done()):
+                apid, segment, lost, future = self._pending.popleft()
+                try:
+                    pixels = future.result()
+                except Exception as e:
+                    self.logger.error(f"Failed to decode segment of APID {apid}: {e}")
+                    continue
+                self._place_segment(apid, segment, pixels, lost)
+
+    def _collect(self):
+        while True:
+            self._done.wait()
+            # clear before draining: a decode finishing meanwhile sets it again
+            self._done.clear()
+            if self._stopping:
+                return
+            self._drain_pending(wait=False)
+
+    def _new_canvas(self) -> ChannelCanvas:
+        if self.preview:
+            return ChannelCanvas(1, PREVIEW_WIDTH)
+        return ChannelCanvas(BLOCK_HEIGHT, IMAGE_WIDTH)
+
+    def _decode_segment(self, segment: Segment, line: np.ndarray, packet_idx_in_line: int):
+        if self.preview:
+            x0 = packet_idx_in_line * PREVIEW_BLOCK_WIDTH
+            decode_14_blocks_dc(segment.payload, segment.QF, out=line[0], x0=x0)
+        else:
+            x0 = packet_idx_in_line * BLOCK_WIDTH
+            decode_14_blocks(segment.payload, segment.QF, out=line, x0=x0)
+
+    # ---------------- START / STOP, FINAL FLUSH ----------------
 
-    # ---------------- STOP / FINAL FLUSH ----------------
+    def start(self):
+        if self._pool is not None:
+            self._stopping = False
+            self._collector = threading.Thread(
+                target=self._collect, name="ccsds_image_sink", daemon=True)
+            self._collector.start()
+        return super().start()
 
     def stop(self):
+        if self._collector is not None:
+            self._stopping = True
+            self._done.set()
+            self._collector.join()
+            self._collector = None
+        if self._pool is not None:
+            self._drain_pending(wait=True)
+            self._pool.shutdown()
+            self._pool = None
+        self._dump.close()
         self.flush_images()
         return super().stop()
 
     # ---------------- IMAGE GENERATION ----------------
 
     def flush_images(self):
+        suffix = "_preview" if self.preview else ""
+
         for channel in self.apid_to_channel.values():
-            if len(channel.big_rows) > 0:
+            if channel.canvas.lines > 0:
                 img = self.channel_to_gray_image(channel)
-                img.save(self.out_dir / f"pic{channel.apid}.png")
+                img.save(self.out_dir / f"pic{channel.apid}{suffix}.png")
 
         # RGB composite (adjust APIDs if needed)
         r_ch = self.apid_to_channel.get(65)
@@ -251,24 +439,20 @@ class CcsdsImageSink(gr.basic_block):
         b_ch = self.apid_to_channel.get(64)
 
         if r_ch and g_ch and b_ch:
-            if r_ch.big_rows and g_ch.big_rows and b_ch.big_rows:
-
-                r = self.channel_to_gray_image(r_ch)
-                g = self.channel_to_gray_image(g_ch)
-                b = self.channel_to_gray_image(b_ch)
-
-                h = min(r.height, g.height, b.height)
+            if r_ch.canvas.lines and g_ch.canvas.lines and b_ch.canvas.lines:
+                r = r_ch.canvas.pixels()
+                g = g_ch.canvas.pixels()
+                b = b_ch.canvas.pixels()
 
-                r = r.crop((0, 0, IMAGE_WIDTH, h))
-                g = g.crop((0, 0, IMAGE_WIDTH, h))
-                b = b.crop((0, 0, IMAGE_WIDTH, h))
+                h = min(len(r), len(g), len(b))
+                rgb = np.stack((r[:h], g[:h], b[:h]), axis=-1)
 
-                rgb = Image.merge("RGB", (r, g, b))
-                rgb.save(self.out_dir / "composite_rgb.png")
+                img = Image.frombuffer("RGB", (rgb.shape[1], h), rgb, "raw", "RGB", 0, 1)
+                img.save(self.out_dir / f"composite_rgb{suffix}.png")
 
     def channel_to_gray_image(self, channel: Channel) -> Image.Image:
-        height = len(channel.big_rows)
-        img = Image.new("L", (IMAGE_WIDTH, height))
-        flat = [pixel for row in channel.big_rows for pixel in row]
-        img.putdata(flat)
-        return img
\ No newline at end of file
+        # no copy: the image shares the canvas memory (keep the channel
+        # alive while using it)
+        pixels = channel.canvas.pixels()
+        height, width = pixels.shape
+        return Image.frombuffer("L", (width, height), pixels, "raw", "L", 0, 1)
\ No newline at end of file
@@ -2,6 +2,8 @@ from PyQt5 import QtCore, QtWidgets, QtGui, sip
 from gnuradio import gr
 import pmt
 
+from pdu import u8vector_to_numpy
+
 class _GuiBridge(QtCore.QObject):
     request_update = QtCore.pyqtSignal()
 
@@ -47,8 +49,7 @@ class CcsdsImageViewer(gr.sync_block):
         return sip.unwrapinstance(self.widget)
 
     def handle_msg(self, msg):
-        data = pmt.cdr(msg)
-        payload = bytes(pmt.u8vector_elements(data))
+        payload = u8vector_to_numpy(pmt.cdr(msg))
 
         locker = QtCore.QMutexLocker(self._lock)
         try:
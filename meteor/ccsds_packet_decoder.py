@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+#
+# ccsds_packet_decoder.py - GNU Radio hier block (framed CADUs -> space packets per APID)
+#
+# Input:  message port 'in', CADU PDUs from CaduFramer (packed bytes or unpacked bits)
+# Output: one message port per APID (see APID_PORTS)
+#
+from gnuradio import gr
+
+from apid_demux import APID_PORTS, ApidDemux
+from cadu_to_packets import CaduToPackets
+from ccsds_descrambler import CcsdsDescrambler
+from ccsds_rs_decoder import CcsdsRsDecoder
+from space_packet_assembler import SpacePacketAssembler
+from vcdu_parser import VcduParser
+
+
+class CcsdsPacketDecoder(gr.hier_block2):
+    """
+    Descrambling, RS decoding and space packet reassembly of framed CADUs.
+
+    fused=False: CcsdsDescrambler -> CcsdsRsDecoder -> VcduParser ->
+                 SpacePacketAssembler -> ApidDemux
+    fused=True:  CaduToPackets
+
+    Only the selected path is built, so every CADU is decoded once. Both
+    give the same packets; pass_failed is CcsdsRsDecoder's option, for
+    diagnostics only (it does not change the packets).
+    """
+
+    def __init__(self, fused=False, pass_failed=False, frame_len_bytes=1020, interleave=4):
+        gr.hier_block2.__init__(
+            self, "ccsds_packet_decoder",
+            gr.io_signature(0, 0, 0),
+            gr.io_signature(0, 0, 0),
+        )
+        self.message_port_register_hier_in("in")
+        for port in APID_PORTS.values():
+            self.message_port_register_hier_out(port)
+
+        self.fused = bool(fused)
+
+        if self.fused:
+            self.cadu_to_packets = CaduToPackets(
+                frame_len_bytes=frame_len_bytes, interleave=interleave, pass_failed=pass_failed)
+            self._rs = self.cadu_to_packets
+            first, last = self.cadu_to_packets, self.cadu_to_packets
+        else:
+            self.descrambler = CcsdsDescrambler(frame_len_bytes=frame_len_bytes)
+            self.rs_decoder = CcsdsRsDecoder(interleave=interleave, pass_failed=pass_failed)
+            self.vcdu_parser = VcduParser()
+            self.assembler = SpacePacketAssembler()
+            self.apid_demux = ApidDemux(apid_ports=None, catch_all=False)
+            self._rs = self.rs_decoder
+
+            self.msg_connect((self.descrambler, "out"), (self.rs_decoder, "in"))
+            self.msg_connect((self.rs_decoder, "out"), (self.vcdu_parser, "in"))
+            self.msg_connect((self.vcdu_parser, "out"), (self.assembler, "in"))
+            self.msg_connect((self.assembler, "out"), (self.apid_demux, "in"))
+            first, last = self.descrambler, self.apid_demux
+
+        self.msg_connect((self, "in"), (first, "in"))
+        for port in APID_PORTS.values():
+            self.msg_connect((last, port), (self, port))
+
+    def set_pass_failed(self, pass_failed):
+        self._rs.set_pass_failed(pass_failed)
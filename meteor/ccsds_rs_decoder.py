@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+# ccsds_rs_decoder.py - GNU Radio PDU block (descrambled CADU -> corrected VCDU)
+#
+# Input:  PDU (u8vector) of interleave * 255 bytes, a descrambled CADU without the ASM
+# Output: PDU (u8vector) of interleave * 223 bytes, the corrected VCDU
+#         (Reed-Solomon check bytes removed); uncorrectable frames are dropped,
+#         or passed on uncorrected with rs.failed = 1 (pass_failed=True)
+#
+import pmt
+from gnuradio import gr
+
+from pdu import make_pdu, pdu_to_numpy
+from reed_solomon import KK, NN, decode_interleaved
+
+
+def rs_meta(meta, corrected):
+    """meta with the rs.* keys for the corrected list of decode_interleaved() added."""
+    failed = min(corrected) < 0
+    meta = pmt.dict_add(meta, pmt.intern("rs.failed"), pmt.from_long(1 if failed else 0))
+    meta = pmt.dict_add(meta, pmt.intern("rs.corrected"), pmt.from_long(sum(c for c in corrected if c > 0)))
+    meta = pmt.dict_add(meta, pmt.intern("rs.corrected_per_codeword"), pmt.init_s32vector(len(corrected), corrected))
+    return meta
+
+
+class CcsdsRsDecoder(gr.basic_block):
+    """
+    CCSDS RS(255,223) decoder, conventional basis, interleaved codewords
+    (see reed_solomon). A drop-in for gr-satellites' decode_rs(False, interleave).
+
+    Syndromes of all codewords are computed in one numpy pass; frames
+    without errors are passed on right away, only the damaged codewords go
+    through Berlekamp-Massey / Chien / Forney.
+
+    Uncorrectable frames are dropped, or with pass_failed=True passed on
+    as received (check bytes removed) for diagnostics, e.g. to log where
+    the failures are. VcduParser and SpacePacketAssembler ignore them like
+    dropped frames, so the packets are the same either way.
+
+    Extra meta per frame (the framer's cadu.* keys, including the stream
+    offset cadu.offset, are kept):
+      rs.failed                  1 if a codeword was uncorrectable
+      rs.corrected               corrected symbols in the frame
+      rs.corrected_per_codeword  s32vector, corrected symbols of each codeword,
+                                 -1 for uncorrectable ones
+    """
+
+    def __init__(self, interleave=4, pass_failed=False):
+        gr.basic_block.__init__(self, name="ccsds_rs_decoder", in_sig=None, out_sig=None)
+
+        self.interleave = int(interleave)
+        self.frame_len_bytes = NN * self.interleave
+        self.pass_failed = bool(pass_failed)
+
+        self.frames = 0
+        self.failed = 0
+
+        self.message_port_register_in(pmt.intern("in"))
+        self.message_port_register_out(pmt.intern("out"))
+        self.set_msg_handler(pmt.intern("in"), self._handle)
+
+    def set_pass_failed(self, pass_failed):
+        self.pass_failed = bool(pass_failed)
+
+    def _handle(self, msg):
+        meta, frame = pdu_to_numpy(msg)
+
+        if len(frame) != self.frame_len_bytes:
+            self.logger.error(f"RS frame length {len(frame)}, expected {self.frame_len_bytes}")
+            return
+
+        self.frames += 1
+        data, corrected = decode_interleaved(frame, self.interleave)
+        if data is None:
+            self.failed += 1
+            if not self.pass_failed:
+                return
+            data = frame[:KK * self.interleave]
+
+        meta = rs_meta(meta, corrected)
+        self.message_port_pub(pmt.intern("out"), make_pdu(meta, data))
@@ -6,7 +6,10 @@ from __future__ import annotations
 
 import math
 from dataclasses import dataclass
-from typing import List, Tuple
+from functools import lru_cache
+from typing import List
+
+import numpy as np
 
 
 
@@ -52,32 +55,50 @@ T_AC_0: List[int] = [
 
 DC_CAT_OFF: List[int] = [2, 3, 3, 3, 3, 3, 4, 5, 6, 7, 8, 9]
 
+# DC Huffman code of each category, DC_CAT_OFF[cat] bits long (see get_dc_real)
+DC_CODES: List[int] = [0x000, 0x002, 0x003, 0x004, 0x005, 0x006, 0x00E, 0x01E, 0x03E, 0x07E, 0x0FE, 0x1FE]
+
 
 class BitIOConst:
+    """
+    MSB-first bit reader over a constant byte buffer.
+
+    Bits are served from a 64-bit accumulator that is topped up a word at a
+    time, so peek/advance/fetch are a shift and a mask. Reading past the end
+    of the data yields zero bits.
+    """
+
     def __init__(self, data: bytes):
         self._data = data
         self._size = len(data)
-        self._pos = 0  # bit position
-
-    def peek_bits(self, n: int) -> int:
-        result = 0
-        bit = 0
+        self._next = 0   # next byte to load into the accumulator
+        self._acc = 0    # the low _avail bits are the upcoming bits, MSB first
+        self._avail = 0
 
-        for i in range(n):
-            p = self._pos + i
-            byte_index = p >> 3
+    def _refill(self) -> None:
+        # load as many whole bytes as fit into 64 bits; past the end they are 0
+        nbytes = (64 - self._avail) >> 3
+        chunk = self._data[self._next:self._next + nbytes]
+        word = int.from_bytes(chunk, "big") << ((nbytes - len(chunk)) << 3)
 
-            if byte_index < self._size: 
-                bit = (self._data[byte_index] >> (7 - (p & 7))) & 1
-            else:
-                bit = 0
+        self._acc = (self._acc << (nbytes << 3)) | word
+        self._avail += nbytes << 3
+        self._next += nbytes
 
-            result = (result << 1) | bit
-
-        return result
+    def peek_bits(self, n: int) -> int:
+        assert n <= 32
+        if self._avail < n:
+            self._refill()
+        return (self._acc >> (self._avail - n)) & ((1 << n) - 1)
 
     def advance_bits(self, n: int) -> None:
-        self._pos += n
+        while self._avail < n:
+            n -= self._avail
+            self._avail = 0
+            self._acc = 0
+            self._refill()
+        self._avail -= n
+        self._acc &= (1 << self._avail) - 1
 
     def fetch_bits(self, n: int) -> int:
         result = self.peek_bits(n)
@@ -109,6 +130,31 @@ def fill_dqt_by_q(q: float) -> List[int]:
     return dqt
 
 
+# zigzag indices 0..9 all fall into the top-left 4x4 of the block
+LOW_FREQ_LAST = 9
+
+# zigzag order as an index array, for gathering whole blocks at once
+ZIGZAG_INDEX = np.array(ZIGZAG, dtype=np.intp)
+
+
+@lru_cache(maxsize=8)
+def dequant_table_zigzag(q: float) -> np.ndarray:
+    """
+    fill_dqt_by_q(q) permuted into zigzag order, cached per QF.
+
+    For coefficients zdct in zigzag order, (zdct * table)[ZIGZAG_INDEX] is the
+    dequantized block in natural order, with the same products as
+    zdct[ZIGZAG[i]] * dqt[i]. QF rarely changes within a pass, so this is
+    computed once instead of per packet.
+    """
+    dqt = fill_dqt_by_q(q)
+
+    table = np.empty(64, dtype=np.float64)
+    table[ZIGZAG_INDEX] = dqt
+    table.flags.writeable = False
+    return table
+
+
 def map_range(cat: int, vl: int) -> int:
     if cat == 0:
         return 0
@@ -176,41 +222,52 @@ def init_huffman_table():
             min_code[k] = 0xFFFF
             maj_code[k] = 0
 
+    # The codes of length k are the consecutive values min_code[k]..maj_code[k]
+    # (none if min_code[k] is 0xFFFF), so only that slice of the 2^k code space
+    # is walked.
     ac_table: List[AcEntry] = []
 
-    n = 0
     for k in range(1, 17):
         min_val = min_code[k]
         max_val = maj_code[k]
 
-        for i in range(1 << k):
-            if i <= max_val and i >= min_val:
-                size_val = v[(k << 8) + i - min_val]
-                run = size_val >> 4
-                size = size_val & 0xF
-
-                ac_table.append(
-                    AcEntry(
-                        run=run,
-                        size=size,
-                        length=k,
-                        mask=(1 << k) - 1,
-                        code=i,
-                    )
-                )
-                n += 1
-
-    ac_lookup = [0] * 65536
-    for i in range(65536):
-        ac_lookup[i] = get_ac_real(i, ac_table=ac_table)
+        for i in range(min_val, max_val + 1):
+            size_val = v[(k << 8) + i - min_val]
 
-    dc_lookup = [0] * 65536
-    for i in range(65536):
-        dc_lookup[i] = get_dc_real(i)
+            ac_table.append(
+                AcEntry(
+                    run=size_val >> 4,
+                    size=size_val & 0xF,
+                    length=k,
+                    mask=(1 << k) - 1,
+                    code=i,
+                )
+            )
+
+    # A code of length k owns every 16-bit lookahead word starting with it, which
+    # is a contiguous range of 2^(16-k) words. Filling those ranges walks each
+    # code once instead of scanning the table for all 65536 words. Going in
+    # reverse keeps the first match on top, like get_ac_real / get_dc_real.
+    ac_lookup = [-1] * 65536
+    for i in reversed(range(len(ac_table))):
+        entry = ac_table[i]
+        lo = entry.code << (16 - entry.length)
+        hi = (entry.code + 1) << (16 - entry.length)
+        ac_lookup[lo:hi] = [i] * (hi - lo)
+
+    dc_lookup = [-1] * 65536
+    for cat in reversed(range(len(DC_CODES))):
+        length = DC_CAT_OFF[cat]
+        lo = DC_CODES[cat] << (16 - length)
+        hi = (DC_CODES[cat] + 1) << (16 - length)
+        dc_lookup[lo:hi] = [cat] * (hi - lo)
 
     return ac_table, ac_lookup, dc_lookup
 
 
+# Reference lookup, one word at a time (like get_dc_real). init_huffman_table
+# fills its tables directly from the code space; tests/test_decode_jpeg.py
+# checks them against these two.
 def get_ac_real(word: int, ac_table: List[AcEntry]) -> int:
     assert 0 <= word <= 0xFFFF
 
@@ -234,10 +291,26 @@ def init_cos():
 
     return mCosine, mAlpha
 
+
+def init_idct_basis(cosine: List[List[float]], alpha: List[float]) -> np.ndarray:
+    # basis[y][u] = alpha[u] * cos((2y+1) u pi / 16). One of the two factors is
+    # always exactly 1.0, so the product is exact and matches filt_idct8x8.
+    basis = np.empty((8, 8), dtype=np.float64)
+    for y in range(8):
+        for u in range(8):
+            basis[y, u] = alpha[u] * cosine[y][u]
+    return basis
+
+
+# Built once at import (a few ms), shared by every Image instance.
+_HUFFMAN_TABLES = init_huffman_table()
+
+
 class Image:
     def __init__(self) -> None:
-        self._ac_table, self._ac_lookup, self._dc_lookup = init_huffman_table()
+        self._ac_table, self._ac_lookup, self._dc_lookup = _HUFFMAN_TABLES
         self._cosine, self._alpha = init_cos()
+        self._basis = init_idct_basis(self._cosine, self._alpha)
 
     def filt_idct8x8(self, inp: List[float]) -> None:
         assert len(inp) == 64
@@ -261,22 +334,94 @@ class Image:
                 res[y * 8 + x] = s / 4.0
         return res
 
+    def filt_idct8x8_batch(self, blocks: np.ndarray, size: int = 8) -> np.ndarray:
+        """
+        Separable IDCT of N blocks at once: C @ X @ C.T / 4 over an (N, 8, 8) array.
+
+        The two matrix products are spelled out as 8 broadcast multiply-adds each,
+        accumulated in the same order as filt_idct8x8. A BLAS matmul is free to
+        reorder the sums (or use FMA), which is enough to flip round() on .5 ties,
+        so this keeps the clamped pixels bit-identical to the scalar path.
+
+        With size < 8 only the top-left size x size coefficients are used, the
+        rest must be zero. The skipped terms would only add zeros, so the
+        result is the same.
+        """
+        assert blocks.ndim == 3 and blocks.shape[1:] == (8, 8)
+
+        basis = self._basis
+
+        # rows: tmp[n, y, u] = sum_v C[y, v] * X[n, v, u]
+        tmp = np.zeros(blocks.shape, dtype=np.float64)
+        for v in range(size):
+            tmp += blocks[:, None, v, :] * basis[None, :, v, None]
+
+        # cols: res[n, y, x] = sum_u C[x, u] * tmp[n, y, u]
+        res = np.zeros(blocks.shape, dtype=np.float64)
+        for u in range(size):
+            res += basis[None, None, :, u] * tmp[:, :, u, None]
+
+        return res / 4.0
+
+    def _idct_sparse(self, dct: np.ndarray, last_nz: List[int]) -> np.ndarray:
+        """
+        IDCT + level shift + clamp of (N, 8, 8) blocks, dispatched on the zigzag
+        index of each block's last non-zero coefficient:
+
+          0                 DC only, the block is one constant value
+          <= LOW_FREQ_LAST  everything is in the top-left 4x4, 4x4 kernel
+          otherwise         full 8x8 IDCT
+
+        Output is identical to running the full IDCT on every block.
+        """
+        pixels = np.empty(dct.shape, dtype=np.uint8)
+
+        dc_only = [m for m, last in enumerate(last_nz) if last == 0]
+        low = [m for m, last in enumerate(last_nz) if 0 < last <= LOW_FREQ_LAST]
+        full = [m for m, last in enumerate(last_nz) if last > LOW_FREQ_LAST]
+
+        if dc_only:
+            # what the full IDCT computes for a lone DC term: C[x,0] * (C[y,0] * X[0,0]) / 4
+            a = self._basis[0, 0]
+            level = (a * (dct[dc_only, 0, 0] * a)) / 4.0
+            level = np.clip(np.rint(level + 128.0), 0, 255).astype(np.uint8)
+            pixels[dc_only] = level[:, None, None]
+
+        if low:
+            img_dct = self.filt_idct8x8_batch(dct[low], size=4)
+            pixels[low] = np.clip(np.rint(img_dct + 128.0), 0, 255)
+
+        if full:
+            img_dct = self.filt_idct8x8_batch(dct[full])
+            pixels[full] = np.clip(np.rint(img_dct + 128.0), 0, 255)
+
+        return pixels
+
     def decode_14_blocks(
         self,
         payload: bytes,
         qf: float,
-    ) -> list[list[int]]:
+        out: np.ndarray | None = None,
+        x0: int = 0,
+    ) -> np.ndarray:
+        """
+        Decode the 14 blocks of one MCU segment into an (8, 112) uint8 strip.
+
+        If `out` is given (an (8, W) uint8 buffer, e.g. one 8 x 1568 image line)
+        the pixels are written into out[:, x0:x0 + 112] and that view is
+        returned, otherwise a new array is allocated.
+        """
 
         bitio = BitIOConst(payload)
 
-        zdct = [0.0] * 64
-        dct = [0.0] * 64
+        # coefficients in zigzag order; only non-zero ones are written
+        zdct = np.zeros((14, 64), dtype=np.float64)
 
-        dqt = fill_dqt_by_q(qf)
+        dqt = dequant_table_zigzag(qf)
         prev_dc = 0.0 
 
-        strip = [[0 for _ in range(14 * 8)] for _ in range(8)]
-
+        # zigzag index of the last non-zero coefficient of each block
+        last_nz = [0] * 14
 
         for m in range(14):
 
@@ -287,8 +432,8 @@ class Image:
             bitio.advance_bits(DC_CAT_OFF[dc_cat])
             n = bitio.fetch_bits(dc_cat)
 
-            zdct[0] = map_range(dc_cat, n) + prev_dc
-            prev_dc = zdct[0]
+            prev_dc = map_range(dc_cat, n) + prev_dc
+            zdct[m, 0] = prev_dc
 
             k = 1
             while k < 64:
@@ -303,51 +448,132 @@ class Image:
 
 
                 if ac_run == 0 and ac_size == 0:
-                    i = k
-                    while i < 64:
-                        zdct[i] = 0.0
-                        i += 1
                     break
 
-                for _ in range(ac_run):
-                    zdct[k] = 0.0
-                    k += 1
+                k += ac_run
 
                 if ac_size != 0:
+                    if k >= 64:
+                        raise ValueError("AC run past end of block")
                     n = bitio.fetch_bits(ac_size)
-                    zdct[k] = float(map_range(ac_size, n))
+                    zdct[m, k] = map_range(ac_size, n)
+                    last_nz[m] = k
                     k += 1
                 else:
                     if ac_run == 15:
-                        zdct[k] = 0.0
                         k += 1
+                    if k > 64:
+                        raise ValueError("AC run past end of block")
 
-            for i in range(64):
-                dct[i] = float(zdct[ZIGZAG[i]] * dqt[i])
-
-            img_dct = self.filt_idct8x8(dct)
+        # dequantize and un-zigzag all blocks in one gather-multiply
+        dct = (zdct * dqt)[:, ZIGZAG_INDEX].reshape(14, 8, 8)
 
-            x_offset = m * 8
-            for i in range(64):
-                t = int(round(img_dct[i] + 128.0))
-                if t < 0:
-                    t = 0
-                if t > 255:
-                    t = 255
+        pixels = self._idct_sparse(dct, last_nz)
 
-                row = i // 8
-                col = i % 8
-                strip[row][x_offset + col] = t
+        if out is None:
+            out = np.empty((8, 14 * 8), dtype=np.uint8)
 
+        # (block, row, col) -> (row, block * 8 + col)
+        strip = out[:, x0:x0 + 14 * 8]
+        strip[...] = pixels.transpose(1, 0, 2).reshape(8, 14 * 8)
         return strip
 
+    def decode_14_blocks_dc(
+        self,
+        payload: bytes,
+        qf: float,
+        out: np.ndarray | None = None,
+        x0: int = 0,
+    ) -> np.ndarray:
+        """
+        Preview decode: one pixel per block, the block average (its DC term).
+
+        AC codes are only skipped over using the Huffman tables, nothing is
+        dequantized or transformed. Returns 14 uint8 pixels, written into
+        out[x0:x0 + 14] if `out` is given. A full image line (8 rows of 1568)
+        becomes a single row of 196 pixels.
+        """
+
+        bitio = BitIOConst(payload)
+
+        dc = np.empty(14, dtype=np.float64)
+        prev_dc = 0.0
+
+        for m in range(14):
+
+            dc_cat = self._dc_lookup[bitio.peek_bits(16)]
+            if dc_cat == -1:
+                raise ValueError("Bad DC Huffman code")
+
+            bitio.advance_bits(DC_CAT_OFF[dc_cat])
+            n = bitio.fetch_bits(dc_cat)
+
+            prev_dc = map_range(dc_cat, n) + prev_dc
+            dc[m] = prev_dc
+
+            k = 1
+            while k < 64:
+                ac = self._ac_lookup[bitio.peek_bits(16)]
+                if ac == -1:
+                    raise ValueError("Bad AC Huffman code")
+
+                entry = self._ac_table[ac]
+                bitio.advance_bits(entry.length + entry.size)
+
+                if entry.run == 0 and entry.size == 0:
+                    break
+
+                k += entry.run
+                if entry.size != 0 or entry.run == 15:
+                    k += 1
+
+        # same value the DC-only IDCT path produces for every pixel of the block
+        a = self._basis[0, 0]
+        level = (a * ((dc * dequant_table_zigzag(qf)[0]) * a)) / 4.0
+
+        if out is None:
+            out = np.empty(14, dtype=np.uint8)
+
+        thumb = out[x0:x0 + 14]
+        thumb[...] = np.clip(np.rint(level + 128.0), 0, 255)
+        return thumb
+
 # Convenience function (stateless entrypoint)
 _decoder_singleton: Image | None = None
 
 
-def decode_14_blocks(payload: bytes, qf: float) -> Tuple[List[List[int]], float]:
+def get_decoder() -> Image:
     global _decoder_singleton
     if _decoder_singleton is None:
         _decoder_singleton = Image()
-    return _decoder_singleton.decode_14_blocks(payload=payload, qf=qf)
+    return _decoder_singleton
+
+
+def decode_14_blocks(
+    payload: bytes,
+    qf: float,
+    out: np.ndarray | None = None,
+    x0: int = 0,
+) -> np.ndarray:
+    return get_decoder().decode_14_blocks(payload=payload, qf=qf, out=out, x0=x0)
+
+
+def decode_14_blocks_dc(
+    payload: bytes,
+    qf: float,
+    out: np.ndarray | None = None,
+    x0: int = 0,
+) -> np.ndarray:
+    return get_decoder().decode_14_blocks_dc(payload=payload, qf=qf, out=out, x0=x0)
+
+
+# Worker process entry points (module level so they can be pickled)
+
+def init_worker() -> None:
+    get_decoder()
+
 
+def decode_segment(payload: bytes, qf: float, preview: bool = False) -> np.ndarray:
+    if preview:
+        return decode_14_blocks_dc(payload, qf)
+    return decode_14_blocks(payload, qf)
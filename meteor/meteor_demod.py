@@ -64,6 +64,7 @@ from argparse import ArgumentParser
 from gnuradio.eng_arg import eng_float, intx
 from gnuradio import eng_notation
 from meteor_lrpt import meteor_lrpt  # grc-generated hier_block
+from metrics_viewer import MetricsViewer
 import sip
 import threading
 
@@ -111,105 +112,6 @@ class meteor_demod(gr.top_block, Qt.QWidget):
         # Blocks
         ##################################################
 
-        self.qtgui_number_sink_0_1 = qtgui.number_sink(
-            gr.sizeof_float,
-            0,
-            qtgui.NUM_GRAPH_NONE,
-            1,
-            None # parent
-        )
-        self.qtgui_number_sink_0_1.set_update_time(0.10)
-        self.qtgui_number_sink_0_1.set_title('')
-
-        labels = ['SNR (dB)', '', '', '', '',
-            '', '', '', '', '']
-        units = ['', '', '', '', '',
-            '', '', '', '', '']
-        colors = [("black", "black"), ("black", "black"), ("black", "black"), ("black", "black"), ("black", "black"),
-            ("black", "black"), ("black", "black"), ("black", "black"), ("black", "black"), ("black", "black")]
-        factor = [1, 1, 1, 1, 1,
-            1, 1, 1, 1, 1]
-
-        for i in range(1):
-            self.qtgui_number_sink_0_1.set_min(i, 0)
-            self.qtgui_number_sink_0_1.set_max(i, 1)
-            self.qtgui_number_sink_0_1.set_color(i, colors[i][0], colors[i][1])
-            if len(labels[i]) == 0:
-                self.qtgui_number_sink_0_1.set_label(i, "Data {0}".format(i))
-            else:
-                self.qtgui_number_sink_0_1.set_label(i, labels[i])
-            self.qtgui_number_sink_0_1.set_unit(i, units[i])
-            self.qtgui_number_sink_0_1.set_factor(i, factor[i])
-
-        self.qtgui_number_sink_0_1.enable_autoscale(False)
-        self._qtgui_number_sink_0_1_win = sip.wrapinstance(self.qtgui_number_sink_0_1.qwidget(), Qt.QWidget)
-        self.top_layout.addWidget(self._qtgui_number_sink_0_1_win)
-        self.qtgui_number_sink_0_0 = qtgui.number_sink(
-            gr.sizeof_float,
-            0,
-            qtgui.NUM_GRAPH_NONE,
-            1,
-            None # parent
-        )
-        self.qtgui_number_sink_0_0.set_update_time(0.10)
-        self.qtgui_number_sink_0_0.set_title('')
-
-        labels = ['Frequency', '', '', '', '',
-            '', '', '', '', '']
-        units = ['', '', '', '', '',
-            '', '', '', '', '']
-        colors = [("black", "black"), ("black", "black"), ("black", "black"), ("black", "black"), ("black", "black"),
-            ("black", "black"), ("black", "black"), ("black", "black"), ("black", "black"), ("black", "black")]
-        factor = [1, 1, 1, 1, 1,
-            1, 1, 1, 1, 1]
-
-        for i in range(1):
-            self.qtgui_number_sink_0_0.set_min(i, 0)
-            self.qtgui_number_sink_0_0.set_max(i, 1)
-            self.qtgui_number_sink_0_0.set_color(i, colors[i][0], colors[i][1])
-            if len(labels[i]) == 0:
-                self.qtgui_number_sink_0_0.set_label(i, "Data {0}".format(i))
-            else:
-                self.qtgui_number_sink_0_0.set_label(i, labels[i])
-            self.qtgui_number_sink_0_0.set_unit(i, units[i])
-            self.qtgui_number_sink_0_0.set_factor(i, factor[i])
-
-        self.qtgui_number_sink_0_0.enable_autoscale(False)
-        self._qtgui_number_sink_0_0_win = sip.wrapinstance(self.qtgui_number_sink_0_0.qwidget(), Qt.QWidget)
-        self.top_layout.addWidget(self._qtgui_number_sink_0_0_win)
-        self.qtgui_number_sink_0 = qtgui.number_sink(
-            gr.sizeof_float,
-            0,
-            qtgui.NUM_GRAPH_NONE,
-            1,
-            None # parent
-        )
-        self.qtgui_number_sink_0.set_update_time(0.10)
-        self.qtgui_number_sink_0.set_title('')
-
-        labels = ['BER', '', '', '', '',
-            '', '', '', '', '']
-        units = ['', '', '', '', '',
-            '', '', '', '', '']
-        colors = [("black", "black"), ("black", "black"), ("black", "black"), ("black", "black"), ("black", "black"),
-            ("black", "black"), ("black", "black"), ("black", "black"), ("black", "black"), ("black", "black")]
-        factor = [1, 1, 1, 1, 1,
-            1, 1, 1, 1, 1]
-
-        for i in range(1):
-            self.qtgui_number_sink_0.set_min(i, 0)
-            self.qtgui_number_sink_0.set_max(i, 1)
-            self.qtgui_number_sink_0.set_color(i, colors[i][0], colors[i][1])
-            if len(labels[i]) == 0:
-                self.qtgui_number_sink_0.set_label(i, "Data {0}".format(i))
-            else:
-                self.qtgui_number_sink_0.set_label(i, labels[i])
-            self.qtgui_number_sink_0.set_unit(i, units[i])
-            self.qtgui_number_sink_0.set_factor(i, factor[i])
-
-        self.qtgui_number_sink_0.enable_autoscale(False)
-        self._qtgui_number_sink_0_win = sip.wrapinstance(self.qtgui_number_sink_0.qwidget(), Qt.QWidget)
-        self.top_layout.addWidget(self._qtgui_number_sink_0_win)
         self.qtgui_freq_sink_x_0 = qtgui.freq_sink_c(
             1024, #size
             window.WIN_RECTANGULAR, #wintype
@@ -302,7 +204,11 @@ class meteor_demod(gr.top_block, Qt.QWidget):
             self.top_grid_layout.setRowStretch(r, 1)
         for c in range(0, 1):
             self.top_grid_layout.setColumnStretch(c, 1)
+        self.metrics_viewer_0 = MetricsViewer()
+        self._metrics_viewer_0_win = sip.wrapinstance(self.metrics_viewer_0.qwidget(), Qt.QWidget)
+        self.top_layout.addWidget(self._metrics_viewer_0_win)
         self.meteor_lrpt_0 = meteor_lrpt(
+            metrics_rate=10,
             sample_rate=sample_rate,
         )
         self.ccsds_image_viewer_0 = self.ccsds_image_viewer_0 = CcsdsImageViewer(1568)
@@ -321,13 +227,11 @@ class meteor_demod(gr.top_block, Qt.QWidget):
         # Connections
         ##################################################
         self.msg_connect((self.ccsds_image_decoder_0, 'out'), (self.ccsds_image_viewer_0, 'in'))
+        self.msg_connect((self.meteor_lrpt_0, 'metrics'), (self.metrics_viewer_0, 'in'))
         self.msg_connect((self.meteor_lrpt_0, 'msu_mr_1'), (self.ccsds_image_decoder_0, 'in'))
         self.connect((self.blocks_file_source_0, 0), (self.meteor_lrpt_0, 0))
         self.connect((self.blocks_file_source_0, 0), (self.qtgui_freq_sink_x_0, 0))
         self.connect((self.meteor_lrpt_0, 0), (self.qtgui_const_sink_x_0_0_0_0, 0))
-        self.connect((self.meteor_lrpt_0, 1), (self.qtgui_number_sink_0, 0))
-        self.connect((self.meteor_lrpt_0, 2), (self.qtgui_number_sink_0_0, 0))
-        self.connect((self.meteor_lrpt_0, 3), (self.qtgui_number_sink_0_1, 0))
 
 
     def closeEvent(self, event):
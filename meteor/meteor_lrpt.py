@@ -44,15 +44,14 @@ def get_state_directory() -> str:
 
 sys.path.append(os.environ.get('GRC_HIER_PATH', get_state_directory()))
 
-from apid_filter import ApidFilter
 from ccsds_channel_decoder import ccsds_channel_decoder  # grc-generated hier_block
+from ccsds_packet_decoder import CcsdsPacketDecoder
 from gnuradio import gr
 from gnuradio.filter import firdes
 from gnuradio.fft import window
+from metrics_aggregator import MetricsAggregator
 import signal
 from oqpsk_demodulator import oqpsk_demodulator  # grc-generated hier_block
-from space_packet_assembler import SpacePacketAssembler
-from vcdu_parser import VcduParser
 import threading
 
 
@@ -62,12 +61,13 @@ import threading
 
 
 class meteor_lrpt(gr.hier_block2):
-    def __init__(self, sample_rate=0):
+    def __init__(self, fused_packet_path=False, metrics_rate=10, rs_pass_failed=False, sample_rate=0, viterbi_decoder='gr-fec'):
         gr.hier_block2.__init__(
             self, "Meteor M N 2.x LRPT 72k",
                 gr.io_signature(1, 1, gr.sizeof_gr_complex*1),
-                gr.io_signature.makev(4, 4, [gr.sizeof_gr_complex*1, gr.sizeof_float*1, gr.sizeof_float*1, gr.sizeof_float*1]),
+                gr.io_signature(1, 1, gr.sizeof_gr_complex*1),
         )
+        self.message_port_register_hier_out("metrics")
         self.message_port_register_hier_out("msu_mr_1")
         self.message_port_register_hier_out("msu_mr_2")
         self.message_port_register_hier_out("msu_mr_3")
@@ -79,54 +79,67 @@ class meteor_lrpt(gr.hier_block2):
         ##################################################
         # Parameters
         ##################################################
+        self.fused_packet_path = fused_packet_path
+        self.metrics_rate = metrics_rate
+        self.rs_pass_failed = rs_pass_failed
         self.sample_rate = sample_rate
+        self.viterbi_decoder = viterbi_decoder
 
         ##################################################
         # Blocks
         ##################################################
 
-        self.vcdu_parser_0 = VcduParser()
-        self.space_packet_assembler_0 = SpacePacketAssembler()
         self.oqpsk_demodulator_0 = oqpsk_demodulator(
+            metrics_rate=metrics_rate,
             sample_rate=sample_rate,
         )
-        self.ccsds_channel_decoder_0 = ccsds_channel_decoder()
-        self.ccsds_apid_filter_0_0_0_0_0_0_0 = ApidFilter(apid=70)
-        self.ccsds_apid_filter_0_0_0_0_0_0 = ApidFilter(apid=69)
-        self.ccsds_apid_filter_0_0_0_0_0 = ApidFilter(apid=68)
-        self.ccsds_apid_filter_0_0_0_0 = ApidFilter(apid=67)
-        self.ccsds_apid_filter_0_0_0 = ApidFilter(apid=66)
-        self.ccsds_apid_filter_0_0 = ApidFilter(apid=65)
-        self.ccsds_apid_filter_0 = ApidFilter(apid=64)
+        self.metrics_aggregator_0 = MetricsAggregator(rate=metrics_rate)
+        self.ccsds_packet_decoder_0 = CcsdsPacketDecoder(fused=fused_packet_path, pass_failed=rs_pass_failed, frame_len_bytes=1020, interleave=4)
+        self.ccsds_channel_decoder_0 = ccsds_channel_decoder(
+            viterbi_decoder=viterbi_decoder,
+        )
 
 
         ##################################################
         # Connections
         ##################################################
-        self.msg_connect((self.ccsds_apid_filter_0, 'out'), (self, 'msu_mr_1'))
-        self.msg_connect((self.ccsds_apid_filter_0_0, 'out'), (self, 'msu_mr_2'))
-        self.msg_connect((self.ccsds_apid_filter_0_0_0, 'out'), (self, 'msu_mr_3'))
-        self.msg_connect((self.ccsds_apid_filter_0_0_0_0, 'out'), (self, 'msu_mr_4'))
-        self.msg_connect((self.ccsds_apid_filter_0_0_0_0_0, 'out'), (self, 'msu_mr_5'))
-        self.msg_connect((self.ccsds_apid_filter_0_0_0_0_0_0, 'out'), (self, 'msu_mr_6'))
-        self.msg_connect((self.ccsds_apid_filter_0_0_0_0_0_0_0, 'out'), (self, 'telemetry'))
-        self.msg_connect((self.ccsds_channel_decoder_0, 'cadus'), (self.vcdu_parser_0, 'in'))
-        self.msg_connect((self.space_packet_assembler_0, 'out'), (self.ccsds_apid_filter_0, 'in'))
-        self.msg_connect((self.space_packet_assembler_0, 'out'), (self.ccsds_apid_filter_0_0, 'in'))
-        self.msg_connect((self.space_packet_assembler_0, 'out'), (self.ccsds_apid_filter_0_0_0, 'in'))
-        self.msg_connect((self.space_packet_assembler_0, 'out'), (self.ccsds_apid_filter_0_0_0_0, 'in'))
-        self.msg_connect((self.space_packet_assembler_0, 'out'), (self.ccsds_apid_filter_0_0_0_0_0, 'in'))
-        self.msg_connect((self.space_packet_assembler_0, 'out'), (self.ccsds_apid_filter_0_0_0_0_0_0, 'in'))
-        self.msg_connect((self.space_packet_assembler_0, 'out'), (self.ccsds_apid_filter_0_0_0_0_0_0_0, 'in'))
-        self.msg_connect((self.vcdu_parser_0, 'out'), (self.space_packet_assembler_0, 'in'))
-        self.connect((self.ccsds_channel_decoder_0, 0), (self, 1))
+        self.msg_connect((self.ccsds_channel_decoder_0, 'frames'), (self.ccsds_packet_decoder_0, 'in'))
+        self.msg_connect((self.ccsds_channel_decoder_0, 'metrics'), (self.metrics_aggregator_0, 'in'))
+        self.msg_connect((self.ccsds_packet_decoder_0, 'msu_mr_1'), (self, 'msu_mr_1'))
+        self.msg_connect((self.ccsds_packet_decoder_0, 'msu_mr_2'), (self, 'msu_mr_2'))
+        self.msg_connect((self.ccsds_packet_decoder_0, 'msu_mr_3'), (self, 'msu_mr_3'))
+        self.msg_connect((self.ccsds_packet_decoder_0, 'msu_mr_4'), (self, 'msu_mr_4'))
+        self.msg_connect((self.ccsds_packet_decoder_0, 'msu_mr_5'), (self, 'msu_mr_5'))
+        self.msg_connect((self.ccsds_packet_decoder_0, 'msu_mr_6'), (self, 'msu_mr_6'))
+        self.msg_connect((self.ccsds_packet_decoder_0, 'telemetry'), (self, 'telemetry'))
+        self.msg_connect((self.metrics_aggregator_0, 'metrics'), (self, 'metrics'))
+        self.msg_connect((self.oqpsk_demodulator_0, 'metrics'), (self.metrics_aggregator_0, 'in'))
         self.connect((self.oqpsk_demodulator_0, 1), (self.ccsds_channel_decoder_0, 0))
         self.connect((self.oqpsk_demodulator_0, 0), (self, 0))
-        self.connect((self.oqpsk_demodulator_0, 2), (self, 2))
-        self.connect((self.oqpsk_demodulator_0, 3), (self, 3))
         self.connect((self, 0), (self.oqpsk_demodulator_0, 0))
 
 
+    def get_fused_packet_path(self):
+        return self.fused_packet_path
+
+    def set_fused_packet_path(self, fused_packet_path):
+        self.fused_packet_path = fused_packet_path
+
+    def get_metrics_rate(self):
+        return self.metrics_rate
+
+    def set_metrics_rate(self, metrics_rate):
+        self.metrics_rate = metrics_rate
+        self.metrics_aggregator_0.set_rate(self.metrics_rate)
+        self.oqpsk_demodulator_0.set_metrics_rate(self.metrics_rate)
+
+    def get_rs_pass_failed(self):
+        return self.rs_pass_failed
+
+    def set_rs_pass_failed(self, rs_pass_failed):
+        self.rs_pass_failed = rs_pass_failed
+        self.ccsds_packet_decoder_0.set_pass_failed(self.rs_pass_failed)
+
     def get_sample_rate(self):
         return self.sample_rate
 
@@ -134,3 +147,10 @@ class meteor_lrpt(gr.hier_block2):
         self.sample_rate = sample_rate
         self.oqpsk_demodulator_0.set_sample_rate(self.sample_rate)
 
+    def get_viterbi_decoder(self):
+        return self.viterbi_decoder
+
+    def set_viterbi_decoder(self, viterbi_decoder):
+        self.viterbi_decoder = viterbi_decoder
+        self.ccsds_channel_decoder_0.set_viterbi_decoder(self.viterbi_decoder)
+
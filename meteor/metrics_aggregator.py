@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# metrics_aggregator.py - GNU Radio message block (metric updates -> periodic metrics dict)
+#
+# Input:  message port 'in', any mix of
+#         PMT dicts {name: value} (BER, SNR, Doppler, frame sync stats, ...
+#         updates), other messages are ignored
+# Output: message port 'metrics', a PMT dict with the latest value of every
+#         metric, `rate` times per second from a timer thread (also while
+#         no updates come in), or on every update with rate=0
+#
+import threading
+
+import pmt
+from gnuradio import gr
+
+
+class MetricsAggregator(gr.basic_block):
+
+    def __init__(self, rate=10.0):
+        gr.basic_block.__init__(self, name="metrics_aggregator", in_sig=None, out_sig=None)
+
+        self._period = 1.0 / float(rate) if float(rate) > 0 else 0.0
+
+        self._values = {}  # metric name -> PMT value
+
+        # _values is written by the message handler and read by the timer
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+        self.message_port_register_in(pmt.intern("in"))
+        self.message_port_register_out(pmt.intern("metrics"))
+        self.set_msg_handler(pmt.intern("in"), self._handle)
+
+    def set_rate(self, rate):
+        self._period = 1.0 / float(rate) if float(rate) > 0 else 0.0
+        self._wakeup.set()
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics_aggregator", daemon=True)
+        self._thread.start()
+        return super().start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return super().stop()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            period = self._period
+            self._wakeup.clear()
+            if period <= 0:
+                # rate 0: the handler emits, sleep until the rate changes
+                self._wakeup.wait()
+                continue
+
+            if not self._wakeup.wait(period):
+                self._emit()
+
+    def _handle(self, msg):
+        with self._lock:
+            updated = self._update(msg)
+        if updated and self._period <= 0:
+            self._emit()
+
+    def _update(self, msg):
+        # a dict is a list of (key . value) pairs; a PDU (meta . vector) passes
+        # pmt.is_dict too, but is no metrics update
+        if not pmt.is_dict(msg) or (pmt.is_pair(msg) and pmt.is_uniform_vector(pmt.cdr(msg))):
+            return False
+
+        items = pmt.dict_items(msg)
+        for i in range(pmt.length(items)):
+            item = pmt.nth(i, items)
+            self._values[pmt.symbol_to_string(pmt.car(item))] = pmt.cdr(item)
+        return True
+
+    def _emit(self):
+        with self._lock:
+            if not self._values:
+                return
+            metrics = pmt.make_dict()
+            for name, value in self._values.items():
+                metrics = pmt.dict_add(metrics, pmt.intern(name), value)
+        self.message_port_pub(pmt.intern("metrics"), metrics)
@@ -0,0 +1,61 @@
+from PyQt5 import QtCore, QtWidgets, sip
+from gnuradio import gr
+import pmt
+
+
+class _GuiBridge(QtCore.QObject):
+    request_update = QtCore.pyqtSignal(str)
+
+    def __init__(self, label, parent=None):
+        super().__init__(parent)
+        self._label = label
+        self.request_update.connect(self._on_request_update, QtCore.Qt.QueuedConnection)
+
+    @QtCore.pyqtSlot(str)
+    def _on_request_update(self, text):
+        self._label.setText(text)
+
+
+class MetricsViewer(gr.sync_block):
+    """
+    Shows the latest metrics dict (e.g. from meteor_lrpt's 'metrics' port)
+    as a name: value list.
+    """
+
+    def __init__(self):
+        gr.sync_block.__init__(self, name="metrics_viewer", in_sig=None, out_sig=None)
+
+        self.widget = QtWidgets.QWidget()
+        self.label = QtWidgets.QLabel(self.widget)
+        self.label.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop)
+        self.label.setTextFormat(QtCore.Qt.PlainText)
+
+        layout = QtWidgets.QVBoxLayout(self.widget)
+        layout.addWidget(self.label)
+
+        self._bridge = _GuiBridge(self.label, parent=self.widget)
+
+        self.message_port_register_in(pmt.intern("in"))
+        self.set_msg_handler(pmt.intern("in"), self.handle_msg)
+
+    def qwidget(self):
+        return sip.unwrapinstance(self.widget)
+
+    def handle_msg(self, msg):
+        if not pmt.is_dict(msg):
+            return
+
+        lines = []
+        items = pmt.dict_items(msg)
+        for i in range(pmt.length(items)):
+            item = pmt.nth(i, items)
+            name = pmt.symbol_to_string(pmt.car(item))
+            value = pmt.cdr(item)
+            if pmt.is_real(value):
+                text = f"{pmt.to_double(value):.4g}"
+            else:
+                text = str(value)
+            lines.append(f"{name}: {text}")
+
+        # runs on the scheduler thread, the label is updated on the Qt thread
+        self._bridge.request_update.emit("\n".join(sorted(lines)))
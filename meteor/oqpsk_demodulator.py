@@ -16,7 +16,8 @@ from gnuradio import gr
 from gnuradio.fft import window
 import sys
 import signal
-import tag_to_float
+import stream_probe
+import tag_to_message
 import threading
 
 
@@ -26,16 +27,18 @@ import threading
 
 
 class oqpsk_demodulator(gr.hier_block2):
-    def __init__(self, sample_rate=0):
+    def __init__(self, metrics_rate=10, sample_rate=0):
         gr.hier_block2.__init__(
             self, "OQPSK Demodulator",
                 gr.io_signature(1, 1, gr.sizeof_gr_complex*1),
-                gr.io_signature.makev(4, 4, [gr.sizeof_gr_complex*1, gr.sizeof_float*1, gr.sizeof_float*1, gr.sizeof_float*1]),
+                gr.io_signature.makev(2, 2, [gr.sizeof_gr_complex*1, gr.sizeof_float*1]),
         )
+        self.message_port_register_hier_out("metrics")
 
         ##################################################
         # Parameters
         ##################################################
+        self.metrics_rate = metrics_rate
         self.sample_rate = sample_rate
 
         ##################################################
@@ -49,7 +52,8 @@ class oqpsk_demodulator(gr.hier_block2):
         # Blocks
         ##################################################
 
-        self.tag_value_to_float_0 = tag_to_float.TagToFloat(tag_key='snr')
+        self.tag_to_message_0 = tag_to_message.TagToMessage(tag_key='snr', key='snr_db')
+        self.stream_probe_0 = stream_probe.StreamProbe(decimation=(max(1, int(pipeline_sample_rate / metrics_rate)) if metrics_rate > 0 else pipeline_sample_rate // 10), scale=(1.0 / (2.0 * 3.141592654) * pipeline_sample_rate), key='doppler_hz')
         self.rational_resampler_xxx_0 = filter.rational_resampler_ccc(
                 interpolation=pipeline_sample_rate,
                 decimation=sample_rate,
@@ -62,7 +66,6 @@ class oqpsk_demodulator(gr.hier_block2):
         self.digital_clock_recovery_mm_xx_0 = digital.clock_recovery_mm_cc(sps, (0.25 * 0.0087 * 0.0087), 0.5, 0.0087, 0.005)
         self.blocks_null_sink_0_0 = blocks.null_sink(gr.sizeof_float*1)
         self.blocks_null_sink_0 = blocks.null_sink(gr.sizeof_float*1)
-        self.blocks_multiply_const_vxx_0 = blocks.multiply_const_ff((1.0 / (2.0 * 3.141592654) * pipeline_sample_rate))
         self.blocks_interleave_0 = blocks.interleave(gr.sizeof_float*1, 1)
         self.blocks_float_to_complex_0_0 = blocks.float_to_complex(1)
         self.blocks_delay_0_0 = blocks.delay(gr.sizeof_float*1, (sps // 2))
@@ -74,6 +77,8 @@ class oqpsk_demodulator(gr.hier_block2):
         ##################################################
         # Connections
         ##################################################
+        self.msg_connect((self.stream_probe_0, 'out'), (self, 'metrics'))
+        self.msg_connect((self.tag_to_message_0, 'out'), (self, 'metrics'))
         self.connect((self.analog_agc2_xx_0, 0), (self.fir_filter_xxx_1, 0))
         self.connect((self.blocks_complex_to_float_0, 1), (self.blocks_interleave_0, 1))
         self.connect((self.blocks_complex_to_float_0, 0), (self.blocks_interleave_0, 0))
@@ -82,21 +87,26 @@ class oqpsk_demodulator(gr.hier_block2):
         self.connect((self.blocks_delay_0_0, 0), (self.blocks_float_to_complex_0_0, 1))
         self.connect((self.blocks_float_to_complex_0_0, 0), (self.digital_clock_recovery_mm_xx_0, 0))
         self.connect((self.blocks_interleave_0, 0), (self, 1))
-        self.connect((self.blocks_multiply_const_vxx_0, 0), (self, 2))
         self.connect((self.digital_clock_recovery_mm_xx_0, 0), (self.blocks_complex_to_float_0, 0))
         self.connect((self.digital_clock_recovery_mm_xx_0, 0), (self.digital_mpsk_snr_est_cc_0, 0))
         self.connect((self.digital_clock_recovery_mm_xx_0, 0), (self, 0))
         self.connect((self.digital_costas_loop_cc_0, 0), (self.blocks_complex_to_float_0_0, 0))
-        self.connect((self.digital_costas_loop_cc_0, 1), (self.blocks_multiply_const_vxx_0, 0))
+        self.connect((self.digital_costas_loop_cc_0, 1), (self.stream_probe_0, 0))
         self.connect((self.digital_costas_loop_cc_0, 2), (self.blocks_null_sink_0, 0))
         self.connect((self.digital_costas_loop_cc_0, 3), (self.blocks_null_sink_0_0, 0))
-        self.connect((self.digital_mpsk_snr_est_cc_0, 0), (self.tag_value_to_float_0, 0))
+        self.connect((self.digital_mpsk_snr_est_cc_0, 0), (self.tag_to_message_0, 0))
         self.connect((self.fir_filter_xxx_1, 0), (self.digital_costas_loop_cc_0, 0))
         self.connect((self, 0), (self.rational_resampler_xxx_0, 0))
         self.connect((self.rational_resampler_xxx_0, 0), (self.analog_agc2_xx_0, 0))
-        self.connect((self.tag_value_to_float_0, 0), (self, 3))
 
 
+    def get_metrics_rate(self):
+        return self.metrics_rate
+
+    def set_metrics_rate(self, metrics_rate):
+        self.metrics_rate = metrics_rate
+        self.stream_probe_0.set_decimation((max(1, int(self.pipeline_sample_rate / self.metrics_rate)) if self.metrics_rate > 0 else self.pipeline_sample_rate // 10))
+
     def get_sample_rate(self):
         return self.sample_rate
 
@@ -123,6 +133,7 @@ class oqpsk_demodulator(gr.hier_block2):
 
     def set_pipeline_sample_rate(self, pipeline_sample_rate):
         self.pipeline_sample_rate = pipeline_sample_rate
-        self.blocks_multiply_const_vxx_0.set_k((1.0 / (2.0 * 3.141592654) * self.pipeline_sample_rate))
+        self.stream_probe_0.set_decimation((max(1, int(self.pipeline_sample_rate / self.metrics_rate)) if self.metrics_rate > 0 else self.pipeline_sample_rate // 10))
+        self.stream_probe_0.set_scale((1.0 / (2.0 * 3.141592654) * self.pipeline_sample_rate))
         self.fir_filter_xxx_1.set_taps(firdes.root_raised_cosine(1.0, self.pipeline_sample_rate, self.sym_rate, alpha=0.5, ntaps=31))
 
@@ -0,0 +1,84 @@
+# pdu.py
+# u8vector PDU payloads <-> numpy arrays, without Python lists in between.
+#
+# pmt.u8vector_elements() builds a Python list of ints and
+# pmt.init_u8vector(n, data) walks its argument element by element, which
+# for a 1020 byte CADU costs more than the block's actual work. The
+# serialized form of a u8vector is an 8 byte header followed by the raw
+# bytes, so serialize_str / deserialize_str move the payload as one buffer:
+#
+#   type (0x0a uniform vector), subtype (0x00 u8), length (u32, big endian),
+#   npad (1), 1 pad byte, data
+#
+# The layout is checked once at import; if this PMT build does not match,
+# the helpers fall back to the element-wise calls.
+
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import numpy as np
+import pmt
+
+
+U8VECTOR_HEADER_LEN = 8
+
+
+def _u8vector_header(n: int) -> bytes:
+    return bytes([0x0A, 0x00]) + n.to_bytes(4, "big") + bytes([0x01, 0x00])
+
+
+def _serialized_layout_ok() -> bool:
+    try:
+        probe = bytes([1, 2, 0xFF])
+        vec = pmt.init_u8vector(len(probe), list(probe))
+        blob = pmt.serialize_str(vec)
+        if bytes(blob) != _u8vector_header(len(probe)) + probe:
+            return False
+        back = pmt.deserialize_str(blob)
+        return pmt.is_u8vector(back) and list(pmt.u8vector_elements(back)) == list(probe)
+    except Exception:
+        return False
+
+
+BUFFER_PATH = _serialized_layout_ok()
+
+
+def u8vector_to_numpy(vec) -> np.ndarray:
+    """
+    u8vector -> uint8 array. The array is read-only (it views the serialized
+    buffer), copy it before modifying it in place.
+    """
+    if BUFFER_PATH:
+        return np.frombuffer(pmt.serialize_str(vec), dtype=np.uint8, offset=U8VECTOR_HEADER_LEN)
+    return np.array(pmt.u8vector_elements(vec), dtype=np.uint8)
+
+
+def numpy_to_u8vector(data, offset: int = 0, length: Optional[int] = None):
+    """
+    uint8 array (or bytes / memoryview) -> u8vector of data[offset:offset + length],
+    the whole rest of data by default.
+    """
+    if not isinstance(data, np.ndarray):
+        data = np.frombuffer(data, dtype=np.uint8)
+    end = len(data) if length is None else offset + length
+    data = data[offset:end]
+
+    if BUFFER_PATH:
+        return pmt.deserialize_str(_u8vector_header(data.size) + np.ascontiguousarray(data, dtype=np.uint8).tobytes())
+    return pmt.init_u8vector(data.size, data.astype(np.uint8, copy=False).tolist())
+
+
+def pdu_to_numpy(msg) -> Tuple[object, np.ndarray]:
+    """PDU -> (meta, read-only uint8 array of the payload)."""
+    return pmt.car(msg), u8vector_to_numpy(pmt.cdr(msg))
+
+
+def meta_long(meta, key, default: int = 0) -> int:
+    """Integer meta[key] (key is a str), default if missing."""
+    return pmt.to_long(pmt.dict_ref(meta, pmt.intern(key), pmt.from_long(default)))
+
+
+def make_pdu(meta, data, offset: int = 0, length: Optional[int] = None):
+    """PDU of meta and data[offset:offset + length] (see numpy_to_u8vector)."""
+    return pmt.cons(meta, numpy_to_u8vector(data, offset, length))
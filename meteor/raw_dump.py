@@ -0,0 +1,148 @@
+# raw_dump.py
+# Raw packet dumps, one {apid}.bin per APID, appended to across runs.
+#
+# Every file stays open with a large write buffer. Everything is flushed
+# once flush_bytes were written (checked on write), every flush_interval
+# seconds by a timer thread (also while no packets come in), and on close().
+#
+# With index=True every dump gets an {apid}.idx sidecar, one CSV line per
+# packet:
+#
+#   offset,length,mcun,timestamp
+#
+# offset/length locate the packet in the .bin file, mcun is the MCU number
+# of image segments (-1 otherwise), timestamp the segment time in seconds
+# since the Unix epoch (empty if unknown).
+#
+# The .bin may hold data the index does not cover, written by runs without
+# index=True. Packet boundaries can not be recovered from the .bin alone, so
+# when the index is opened such a range is recorded as
+#
+#   #gap,offset,length
+#
+# and the index stays exact for everything after it. Readers should skip
+# lines starting with '#', and treat the gap ranges as unindexed.
+
+from __future__ import annotations
+
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, TextIO
+
+
+def _indexed_end(path: Path) -> int:
+    """End offset of the last packet or gap in an existing index, 0 if none."""
+    try:
+        with path.open("rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 4096))
+            tail = f.read().decode("ascii", errors="replace")
+    except FileNotFoundError:
+        return 0
+
+    # the last complete line that parses (a crash may have cut the last one)
+    for line in reversed(tail.split("\n")[:-1]):
+        fields = line.removeprefix("#gap,").split(",")
+        try:
+            return int(fields[0]) + int(fields[1])
+        except (IndexError, ValueError):
+            continue
+    return 0
+
+
+class RawDumpWriter:
+
+    def __init__(
+        self,
+        out_dir,
+        buffer_size: int = 1 << 20,
+        flush_bytes: int = 4 << 20,
+        flush_interval: float = 5.0,
+        index: bool = False,
+    ):
+        self.out_dir = Path(out_dir)
+        self.buffer_size = int(buffer_size)
+        self.flush_bytes = int(flush_bytes)
+        self.flush_interval = float(flush_interval)
+        self.index = bool(index)
+
+        self._files: Dict[int, BinaryIO] = {}
+        self._index_files: Dict[int, TextIO] = {}
+        self._offsets: Dict[int, int] = {}  # next write position per APID
+
+        self._unflushed = 0
+
+        # the files are shared by write() and the flush timer
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._timer: Optional[threading.Thread] = None
+
+    def _open(self, apid: int) -> BinaryIO:
+        path = self.out_dir / f"{apid}.bin"
+        f = path.open("ab", buffering=self.buffer_size)
+        self._files[apid] = f
+        self._offsets[apid] = path.stat().st_size
+
+        if self.index:
+            index_path = self.out_dir / f"{apid}.idx"
+            indexed = _indexed_end(index_path)
+            index_file = index_path.open("a", buffering=self.buffer_size)
+            if indexed < self._offsets[apid]:
+                index_file.write(f"#gap,{indexed},{self._offsets[apid] - indexed}\n")
+            self._index_files[apid] = index_file
+
+        if self._timer is None and self.flush_interval > 0:
+            self._closed.clear()
+            self._timer = threading.Thread(target=self._flush_periodically, name="raw_dump_flush", daemon=True)
+            self._timer.start()
+        return f
+
+    def write(self, apid: int, payload: bytes, mcun: int = -1, timestamp: Optional[datetime] = None):
+        with self._lock:
+            f = self._files.get(apid)
+            if f is None:
+                f = self._open(apid)
+
+            f.write(payload)
+
+            if self.index:
+                seconds = "" if timestamp is None else f"{timestamp.timestamp():.6f}"
+                self._index_files[apid].write(f"{self._offsets[apid]},{len(payload)},{mcun},{seconds}\n")
+            self._offsets[apid] += len(payload)
+
+            self._unflushed += len(payload)
+            if self._unflushed >= self.flush_bytes:
+                self._flush()
+
+    def _flush(self):
+        for f in self._files.values():
+            f.flush()
+        for f in self._index_files.values():
+            f.flush()
+        self._unflushed = 0
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        if self._timer is not None:
+            self._closed.set()
+            self._timer.join()
+            self._timer = None
+
+        with self._lock:
+            self._flush()
+            for f in self._files.values():
+                f.close()
+            for f in self._index_files.values():
+                f.close()
+            self._files.clear()
+            self._index_files.clear()
+            self._offsets.clear()
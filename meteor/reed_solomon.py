@@ -0,0 +1,258 @@
+# reed_solomon.py
+# CCSDS Reed-Solomon (255,223), conventional basis, as used by the LRPT CADUs.
+# Port of the decoder in Phil Karn's libfec (decode_rs_8 / encode_rs_8),
+# which is what gr-satellites' decode_rs wraps.
+#
+# GF(256) with field polynomial x^8 + x^7 + x^2 + x + 1 (0x187),
+# generator roots alpha^(11 * (112 + i)), i = 0..31.
+# A codeword's first byte is the highest order coefficient.
+
+from __future__ import annotations
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+MM = 8
+NN = 255
+NROOTS = 32
+KK = NN - NROOTS
+GFPOLY = 0x187
+FCR = 112
+PRIM = 11
+IPRIM = 116     # PRIM * IPRIM = 1 mod NN
+A0 = NN         # log of zero
+
+
+def init_gf_tables() -> Tuple[List[int], List[int]]:
+    alpha_to = [0] * (NN + 1)
+    index_of = [0] * (NN + 1)
+
+    sr = 1
+    for i in range(NN):
+        index_of[sr] = i
+        alpha_to[i] = sr
+        sr <<= 1
+        if sr & (1 << MM):
+            sr ^= GFPOLY
+        sr &= NN
+
+    index_of[0] = A0
+    alpha_to[A0] = 0
+    return alpha_to, index_of
+
+
+ALPHA_TO, INDEX_OF = init_gf_tables()
+
+
+def _modnn(x: int) -> int:
+    while x >= NN:
+        x -= NN
+        x = (x >> MM) + (x & NN)
+    return x
+
+
+def init_genpoly() -> List[int]:
+    """Generator polynomial in index form, genpoly[NROOTS] is the x^NROOTS term."""
+    genpoly = [0] * (NROOTS + 1)
+    genpoly[0] = 1
+
+    root = FCR * PRIM
+    for i in range(NROOTS):
+        genpoly[i + 1] = 1
+        for j in range(i, 0, -1):
+            if genpoly[j] != 0:
+                genpoly[j] = genpoly[j - 1] ^ ALPHA_TO[_modnn(INDEX_OF[genpoly[j]] + root)]
+            else:
+                genpoly[j] = genpoly[j - 1]
+        genpoly[0] = ALPHA_TO[_modnn(INDEX_OF[genpoly[0]] + root)]
+        root += PRIM
+
+    return [INDEX_OF[g] for g in genpoly]
+
+
+GENPOLY = init_genpoly()
+
+
+# ---------------- VECTORIZED SYNDROMES ----------------
+
+# log of a byte, with log(0) mapped past the end of the antilog table below
+_LOG = np.array(INDEX_OF, dtype=np.intp)
+_LOG[0] = 2 * NN
+
+# antilog of 0 .. 2*NN-1 (two periods, so log + exponent needs no modulo),
+# and 0 for the log(0) entries
+_EXP = np.zeros(3 * NN, dtype=np.uint8)
+_EXP[:2 * NN] = np.array(ALPHA_TO[:NN] * 2, dtype=np.uint8)
+
+# syndrome i is r(alpha^((FCR + i) * PRIM)), byte j is the coefficient of x^(NN-1-j)
+_SYNDROME_EXP = (
+    ((FCR + np.arange(NROOTS))[:, None] * PRIM * (NN - 1 - np.arange(NN))[None, :]) % NN
+).astype(np.intp)
+
+
+def syndromes(codewords: np.ndarray) -> np.ndarray:
+    """
+    Syndromes of several codewords at once: codewords (C, 255) uint8 ->
+    (C, 32) uint8, polynomial form. All zero means no errors.
+    """
+    logs = _LOG[codewords]                                   # (C, 255)
+    terms = _EXP[logs[:, None, :] + _SYNDROME_EXP[None]]     # (C, 32, 255)
+    return np.bitwise_xor.reduce(terms, axis=2)
+
+
+# ---------------- BERLEKAMP-MASSEY / CHIEN / FORNEY ----------------
+
+def decode_codeword(data: np.ndarray, syn: np.ndarray) -> int:
+    """
+    Correct one codeword in place, given its (non-zero) syndromes.
+    Returns the number of corrected symbols, or -1 if uncorrectable
+    (data is then left as it was).
+    """
+    s = [INDEX_OF[int(x)] for x in syn]
+
+    # Berlekamp-Massey: error locator lambda, polynomial form
+    lam = [0] * (NROOTS + 1)
+    lam[0] = 1
+    b = [INDEX_OF[x] for x in lam]
+    t = [0] * (NROOTS + 1)
+
+    el = 0
+    for r in range(1, NROOTS + 1):
+        discr_r = 0
+        for i in range(r):
+            if lam[i] != 0 and s[r - i - 1] != A0:
+                discr_r ^= ALPHA_TO[_modnn(INDEX_OF[lam[i]] + s[r - i - 1])]
+        discr_r = INDEX_OF[discr_r]
+
+        if discr_r == A0:
+            b = [A0] + b[:NROOTS]
+            continue
+
+        t[0] = lam[0]
+        for i in range(NROOTS):
+            if b[i] != A0:
+                t[i + 1] = lam[i + 1] ^ ALPHA_TO[_modnn(discr_r + b[i])]
+            else:
+                t[i + 1] = lam[i + 1]
+
+        if 2 * el <= r - 1:
+            el = r - el
+            b = [A0 if x == 0 else _modnn(INDEX_OF[x] - discr_r + NN) for x in lam]
+        else:
+            b = [A0] + b[:NROOTS]
+
+        lam = t[:]
+
+    lam = [INDEX_OF[x] for x in lam]
+    deg_lambda = 0
+    for i in range(NROOTS + 1):
+        if lam[i] != A0:
+            deg_lambda = i
+
+    # Chien search: roots of lambda
+    reg = lam[:]
+    root: List[int] = []
+    loc: List[int] = []
+    k = IPRIM - 1
+    for i in range(1, NN + 1):
+        q = 1
+        for j in range(deg_lambda, 0, -1):
+            if reg[j] != A0:
+                reg[j] = _modnn(reg[j] + j)
+                q ^= ALPHA_TO[reg[j]]
+        if q == 0:
+            root.append(i)
+            loc.append(k)
+            if len(root) == deg_lambda:
+                break
+        k = _modnn(k + IPRIM)
+
+    if len(root) != deg_lambda:
+        return -1
+
+    # error evaluator omega = s * lambda mod x^NROOTS, index form
+    deg_omega = deg_lambda - 1
+    omega = [A0] * (NROOTS + 1)
+    for i in range(deg_omega + 1):
+        tmp = 0
+        for j in range(i, -1, -1):
+            if s[i - j] != A0 and lam[j] != A0:
+                tmp ^= ALPHA_TO[_modnn(s[i - j] + lam[j])]
+        omega[i] = INDEX_OF[tmp]
+
+    # Forney: error values
+    corrections = []
+    for j in range(len(root) - 1, -1, -1):
+        num1 = 0
+        for i in range(deg_omega, -1, -1):
+            if omega[i] != A0:
+                num1 ^= ALPHA_TO[_modnn(omega[i] + i * root[j])]
+        num2 = ALPHA_TO[_modnn(root[j] * (FCR - 1) + NN)]
+
+        # lambda[i + 1] for even i is the formal derivative of lambda
+        den = 0
+        for i in range(min(deg_lambda, NROOTS - 1) & ~1, -1, -2):
+            if lam[i + 1] != A0:
+                den ^= ALPHA_TO[_modnn(lam[i + 1] + i * root[j])]
+        if den == 0:
+            return -1
+
+        if num1 != 0:
+            corrections.append((loc[j], ALPHA_TO[_modnn(INDEX_OF[num1] + INDEX_OF[num2] + NN - INDEX_OF[den])]))
+
+    for pos, value in corrections:
+        data[pos] ^= value
+    return len(root)
+
+
+def encode_codeword(data: np.ndarray) -> np.ndarray:
+    """223 data bytes -> 32 parity bytes (reference encoder, e.g. for test data)."""
+    bb = [0] * NROOTS
+    for x in data.tolist():
+        feedback = INDEX_OF[x ^ bb[0]]
+        if feedback != A0:
+            for j in range(1, NROOTS):
+                bb[j] ^= ALPHA_TO[_modnn(feedback + GENPOLY[NROOTS - j])]
+        bb = bb[1:] + [ALPHA_TO[_modnn(feedback + GENPOLY[0])] if feedback != A0 else 0]
+    return np.array(bb, dtype=np.uint8)
+
+
+# ---------------- INTERLEAVED FRAMES ----------------
+
+def decode_interleaved(frame: np.ndarray, interleave: int = 4) -> Tuple[Optional[np.ndarray], List[int]]:
+    """
+    Decode an interleaved frame of interleave * 255 bytes (byte k belongs to
+    codeword k % interleave).
+
+    Returns (data, corrected): data is the interleave * 223 corrected data
+    bytes, still interleaved, or None if a codeword is uncorrectable;
+    corrected is the number of corrected symbols per codeword, -1 for
+    the uncorrectable ones.
+    """
+    codewords = frame.reshape(NN, interleave).T.copy()
+    syn = syndromes(codewords)
+
+    damaged = np.flatnonzero(syn.any(axis=1))
+    corrected = [0] * interleave
+    if len(damaged) == 0:
+        # error free: no need to touch the data
+        return frame[:KK * interleave], corrected
+
+    for c in damaged:
+        corrected[c] = decode_codeword(codewords[c], syn[c])
+
+    if min(corrected) < 0:
+        return None, corrected
+
+    return codewords[:, :KK].T.reshape(-1), corrected
+
+
+def encode_interleaved(data: np.ndarray, interleave: int = 4) -> np.ndarray:
+    """interleave * 223 data bytes -> interleave * 255 byte frame."""
+    frame = np.empty(NN * interleave, dtype=np.uint8)
+    frame[:KK * interleave] = data
+    for c in range(interleave):
+        frame[KK * interleave + c::interleave] = encode_codeword(data[c::interleave])
+    return frame
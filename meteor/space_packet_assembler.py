@@ -7,121 +7,209 @@
 #         - payload begins at byte [4]
 # Output: PDUs, each one is a complete CCSDS Space Packet payload (data field),
 #         with SpacePacketHeader fields exported to PDU metadata.
+#
+# Packets are reassembled per virtual channel (meta vcdu.virtual_channel_id).
+# A VCDU with vcdu.lost_frames != 0 (see VcduParser) drops the channel's
+# partial packet, instead of completing it with bytes of an unrelated packet.
+# A frame tagged rs.failed is ignored like a dropped one: its header can not
+# be trusted, the next frame of its channel shows the counter gap.
+# space_packet.lost_packets is the number of packets of the APID missing
+# before this one, from the packet sequence count.
 
 import pmt
 from gnuradio import gr
 
+from pdu import make_pdu, meta_long, pdu_to_numpy
+
+
+SPACE_PACKET_HEADER_LEN = 6
+SEQUENCE_COUNT_MODULO = 1 << 14
+
+
+def parse_space_packet_header(data):
+    if len(data) < SPACE_PACKET_HEADER_LEN:
+        raise ValueError(
+            f"not enough bytes for CCSDS header (need {SPACE_PACKET_HEADER_LEN}, got {len(data)})"
+        )
+
+    version = (data[0] >> 5) & 0x07
+    pkt_type = ((data[0] >> 4) & 0x01) == 1
+    secondary_header_flag = ((data[0] >> 3) & 0x01) == 1
+    apid = ((data[0] & 0x07) << 8) | data[1]
+
+    sequence_flag = (data[2] >> 6) & 0x03
+    packet_sequence_count = ((data[2] & 0x3F) << 8) | data[3]
+
+    packet_length = ((data[4] << 8) | data[5]) + 1
+
+    header = {
+        "version": version,
+        "type": 1 if pkt_type else 0,
+        "secondary_header_flag": 1 if secondary_header_flag else 0,
+        "apid": apid,
+        "sequence_flag": sequence_flag,
+        "packet_sequence_count": packet_sequence_count,
+        "packet_length": packet_length,
+    }
+    return header
+
+
+def space_packet_meta(meta, header):
+    """meta with the space_packet.* keys of a parse_space_packet_header() dict added."""
+    meta = pmt.dict_add(meta, pmt.intern("space_packet.ccsds_version"), pmt.from_long(header["version"]))
+    meta = pmt.dict_add(meta, pmt.intern("space_packet.ccsds_type"), pmt.from_long(header["type"]))
+    meta = pmt.dict_add(meta, pmt.intern("space_packet.secondary_header_flag"), pmt.from_long(header["secondary_header_flag"]))
+    meta = pmt.dict_add(meta, pmt.intern("space_packet.apid"), pmt.from_long(header["apid"]))
+    meta = pmt.dict_add(meta, pmt.intern("space_packet.sequence_flag"), pmt.from_long(header["sequence_flag"]))
+    meta = pmt.dict_add(meta, pmt.intern("space_packet.packet_sequence_count"), pmt.from_long(header["packet_sequence_count"]))
+    meta = pmt.dict_add(meta, pmt.intern("space_packet.packet_length"), pmt.from_long(header["packet_length"]))
+    if "lost_packets" in header:
+        meta = pmt.dict_add(meta, pmt.intern("space_packet.lost_packets"), pmt.from_long(header["lost_packets"]))
+    return meta
+
+
+class PacketReassembler:
+    """
+    Space packet reassembly across MPDUs, without the GNU Radio plumbing.
+    push() takes one MPDU and returns the (header, packet data field)
+    pairs completed by it.
+
+    Received packet zone bytes go into one bytearray that always starts at
+    a packet header; complete packets are read from it with a cursor and
+    the consumed bytes are dropped once per MPDU, so the cost is linear in
+    the bytes received however many packets an MPDU holds or however many
+    MPDUs a packet spans.
+
+    Each packet's header dict also gets lost_packets, the gap in its APID's
+    sequence count (0 for the first packet of an APID, or when the count
+    repeats or goes backwards); lost_packets is the running total.
+    """
+
+    NO_HEADER = 0x7FF
+
+    def __init__(self, logger=None):
+        self._buffer = bytearray()
+        self._synced = False  # _buffer starts at a packet header
+        self._logger = logger
+
+        self._sequence = {}  # APID -> last packet sequence count
+        self.lost_packets = 0
+
+    def _error(self, text):
+        if self._logger is not None:
+            self._logger.error(text)
+
+    def reset(self):
+        """
+        Forget any partial packet, wait for the next first header pointer
+        (after lost frames). The sequence counts are kept, so the packets
+        lost with the frames are counted when the APIDs show up again.
+        """
+        self._buffer.clear()
+        self._synced = False
+
+    def _sequence_gap(self, header):
+        apid = header["apid"]
+        count = header["packet_sequence_count"]
+        last = self._sequence.get(apid)
+        self._sequence[apid] = count
+        if last is None:
+            return 0
+
+        gap = (count - last - 1) % SEQUENCE_COUNT_MODULO
+        if gap >= SEQUENCE_COUNT_MODULO // 2:
+            return 0
+
+        self.lost_packets += gap
+        return gap
+
+    def _extract(self, packets):
+        buffer = self._buffer
+        size = len(buffer)
+        pos = 0
+        while size - pos >= SPACE_PACKET_HEADER_LEN:
+            # packet length field first, the header is only parsed for complete packets
+            end = pos + SPACE_PACKET_HEADER_LEN + ((buffer[pos + 4] << 8) | buffer[pos + 5]) + 1
+            if end > size:
+                break
+            header = parse_space_packet_header(buffer[pos:pos + SPACE_PACKET_HEADER_LEN])
+            header["lost_packets"] = self._sequence_gap(header)
+            packets.append((header, bytes(buffer[pos + SPACE_PACKET_HEADER_LEN:end])))
+            pos = end
+        if pos > 0:
+            del buffer[:pos]
+
+    def push(self, mpdu):
+        packets = []
+
+        if len(mpdu) < 4:
+            self._error(f"MPDU too short: {len(mpdu)} bytes (need at least 4)")
+            return packets
+
+        with memoryview(mpdu) as view:
+            first_header_pointer = ((view[2] & 0x07) << 8) | view[3]
+            zone = view[4:]
+
+            if first_header_pointer == self.NO_HEADER:
+                # continuation of the packet in progress (if any)
+                if self._synced:
+                    self._buffer += zone
+                    self._extract(packets)
+                return packets
+
+            if first_header_pointer > len(zone):
+                self._error(f"first header pointer {first_header_pointer} past the end of the MPDU")
+                self.reset()
+                return packets
+
+            # the bytes before the pointer complete the packet in progress,
+            # whatever is left of it after that cannot be a valid packet
+            if self._synced:
+                self._buffer += zone[:first_header_pointer]
+                self._extract(packets)
+
+            self._buffer[:] = zone[first_header_pointer:]
+            self._synced = True
+            self._extract(packets)
+
+        return packets
+
 
 class SpacePacketAssembler(gr.basic_block):
-    SPACE_PACKET_HEADER_LEN = 6
+    SPACE_PACKET_HEADER_LEN = SPACE_PACKET_HEADER_LEN
 
     def __init__(self):
         gr.basic_block.__init__(self, name="space_packet_assembler", in_sig=None, out_sig=None)
 
-        self._partial = None  # type: bytes | None
+        self._reassemblers = {}  # virtual channel id -> PacketReassembler
 
         self.message_port_register_in(pmt.intern("in"))
         self.message_port_register_out(pmt.intern("out"))
         self.set_msg_handler(pmt.intern("in"), self._handle)
 
-    def _parse_space_packet_header(self, data):
-        if len(data) < self.SPACE_PACKET_HEADER_LEN:
-            raise ValueError(
-                f"not enough bytes for CCSDS header (need {self.SPACE_PACKET_HEADER_LEN}, got {len(data)})"
-            )
-
-        version = (data[0] >> 5) & 0x07
-        pkt_type = ((data[0] >> 4) & 0x01) == 1
-        secondary_header_flag = ((data[0] >> 3) & 0x01) == 1
-        apid = ((data[0] & 0x07) << 8) | data[1]
-
-        sequence_flag = (data[2] >> 6) & 0x03
-        packet_sequence_count = ((data[2] & 0x3F) << 8) | data[3]
-
-        packet_length = ((data[4] << 8) | data[5]) + 1
-
-        header = {
-            "version": version,
-            "type": 1 if pkt_type else 0,
-            "secondary_header_flag": 1 if secondary_header_flag else 0,
-            "apid": apid,
-            "sequence_flag": sequence_flag,
-            "packet_sequence_count": packet_sequence_count,
-            "packet_length": packet_length,
-        }
-        return header
+    @property
+    def lost_packets(self):
+        return sum(r.lost_packets for r in self._reassemblers.values())
 
     def _emit_space_packet(self, meta_in, header, payload_bytes):
-        meta = meta_in
-        meta = pmt.dict_add(meta, pmt.intern("space_packet.ccsds_version"), pmt.from_long(header["version"]))
-        meta = pmt.dict_add(meta, pmt.intern("space_packet.ccsds_type"), pmt.from_long(header["type"]))
-        meta = pmt.dict_add(meta, pmt.intern("space_packet.secondary_header_flag"), pmt.from_long(header["secondary_header_flag"]))
-        meta = pmt.dict_add(meta, pmt.intern("space_packet.apid"), pmt.from_long(header["apid"]))
-        meta = pmt.dict_add(meta, pmt.intern("space_packet.sequence_flag"), pmt.from_long(header["sequence_flag"]))
-        meta = pmt.dict_add(meta, pmt.intern("space_packet.packet_sequence_count"), pmt.from_long(header["packet_sequence_count"]))
-        meta = pmt.dict_add(meta, pmt.intern("space_packet.packet_length"), pmt.from_long(header["packet_length"]))
-
-        vec = pmt.init_u8vector(len(payload_bytes), list(payload_bytes))
-        self.message_port_pub(pmt.intern("out"), pmt.cons(meta, vec))
+        meta = space_packet_meta(meta_in, header)
+
+        self.message_port_pub(pmt.intern("out"), make_pdu(meta, payload_bytes))
 
     def _handle(self, msg):
-        meta_in = pmt.car(msg)
-        mpdu = bytes(pmt.u8vector_elements(pmt.cdr(msg)))
+        meta_in, mpdu = pdu_to_numpy(msg)
 
-        if len(mpdu) < 4:
-            self.logger.error(f"MPDU too short: {len(mpdu)} bytes (need at least 4)")
+        if meta_long(meta_in, "rs.failed"):
             return
 
-        first_header_pointer = ((mpdu[2] & 0x07) << 8) | mpdu[3]
-        payload = mpdu[4:]
-
-        # If a new header starts in this frame:
-        if first_header_pointer != 0x7FF:
-            # Close previous partial (if any)
-            if self._partial is not None:
-                self._partial = self._partial + payload[:first_header_pointer]
-
-                # Expect one complete packet in _partial. If too short, drop.
-                # If longer, emit first complete packet and ignore the rest.
-                if len(self._partial) >= self.SPACE_PACKET_HEADER_LEN:
-                    try:
-                        header = self._parse_space_packet_header(self._partial)
-                        full_packet_len = self.SPACE_PACKET_HEADER_LEN + header["packet_length"]
-                        if len(self._partial) >= full_packet_len:
-                            pkt_payload = self._partial[self.SPACE_PACKET_HEADER_LEN:full_packet_len]
-                            self._emit_space_packet(meta_in, header, pkt_payload)
-                    except Exception as e:
-                        self.logger.error(f"Failed to parse/emit partial space packet: {e}")
-
-                self._partial = None
-
-            payload = payload[first_header_pointer:]
-
-        # Parse complete packets from payload
-        while len(payload) >= self.SPACE_PACKET_HEADER_LEN:
-            try:
-                header = self._parse_space_packet_header(payload)
-            except Exception as e:
-                self.logger.error(f"Failed to parse space packet header: {e}")
-                return
-            
-            full_packet_len = self.SPACE_PACKET_HEADER_LEN + header["packet_length"]
-
-            if len(payload) >= full_packet_len:
-                pkt_payload = payload[self.SPACE_PACKET_HEADER_LEN:full_packet_len]
-                self._emit_space_packet(meta_in, header, pkt_payload)
-                payload = payload[full_packet_len:]
-            else:
-                # Not enough: store as partial
-                if self._partial is None:
-                    self._partial = payload
-                else:
-                    self._partial = self._partial + payload
-                payload = b""
-
-        # Any leftover bytes become/extend partial
-        if len(payload) > 0:
-            if self._partial is None:
-                self._partial = payload
-            else:
-                self._partial = self._partial + payload
\ No newline at end of file
+        # without VcduParser meta: a single channel, no gap detection
+        vcid = meta_long(meta_in, "vcdu.virtual_channel_id")
+        reassembler = self._reassemblers.get(vcid)
+        if reassembler is None:
+            reassembler = self._reassemblers[vcid] = PacketReassembler(logger=self.logger)
+
+        if meta_long(meta_in, "vcdu.lost_frames") != 0:
+            reassembler.reset()
+
+        for header, payload in reassembler.push(mpdu):
+            self._emit_space_packet(meta_in, header, payload)
@@ -0,0 +1,60 @@
+import numpy as np
+import pmt
+from gnuradio import gr
+
+
+class StreamProbe(gr.basic_block):
+    """
+    Decimating float probe: consumes a float stream and publishes the average
+    of every `decimation` samples, times `scale`, as a message.
+
+    - Input:  float32 stream
+    - Output: message port 'out', a PMT dict {key: value} per block of samples
+
+    E.g. a Costas loop frequency output at 144 kS/s with decimation=14400
+    becomes 10 messages per second instead of a full rate float stream.
+    """
+
+    def __init__(self, decimation=14400, scale=1.0, key="value"):
+        gr.basic_block.__init__(
+            self,
+            name="stream_probe",
+            in_sig=[np.float32],
+            out_sig=[],
+        )
+
+        self._decimation = max(1, int(decimation))
+        self._scale = float(scale)
+        self._key = pmt.intern(str(key))
+
+        self._sum = 0.0
+        self._count = 0
+
+        self.message_port_register_out(pmt.intern("out"))
+
+    def set_decimation(self, decimation):
+        self._decimation = max(1, int(decimation))
+
+    def set_scale(self, scale):
+        self._scale = float(scale)
+
+    def general_work(self, input_items, output_items):
+        x = input_items[0]
+        n_in = len(x)
+
+        i = 0
+        while i < n_in:
+            take = min(self._decimation - self._count, n_in - i)
+            self._sum += float(np.sum(x[i:i + take], dtype=np.float64))
+            self._count += take
+            i += take
+
+            if self._count == self._decimation:
+                v = self._sum / self._count * self._scale
+                msg = pmt.dict_add(pmt.make_dict(), self._key, pmt.from_double(v))
+                self.message_port_pub(pmt.intern("out"), msg)
+                self._sum = 0.0
+                self._count = 0
+
+        self.consume(0, n_in)
+        return 0
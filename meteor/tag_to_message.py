@@ -0,0 +1,48 @@
+import numpy as np
+import math
+import pmt
+from gnuradio import gr
+
+
+class TagToMessage(gr.basic_block):
+    """
+    Consume a stream (any samples) and publish one message per matching stream tag.
+
+    - Input:  complex64 stream (only used as a carrier for tags)
+    - Output: message port 'out', a PMT dict {key: value} per matched tag
+    - Behavior: reads tags with key=tag_key, converts tag value to double.
+      No passthrough of input samples, no output stream.
+    """
+
+    def __init__(self, tag_key="snr", key="snr_db"):
+        gr.basic_block.__init__(
+            self,
+            name="tag_to_message",
+            in_sig=[np.complex64],
+            out_sig=[],
+        )
+
+        self._tag_key = pmt.intern(str(tag_key))
+        self._key = pmt.intern(str(key))
+
+        self.message_port_register_out(pmt.intern("out"))
+
+    def general_work(self, input_items, output_items):
+        n_in = len(input_items[0])
+        if n_in == 0:
+            return 0
+
+        start = self.nitems_read(0)
+        tags = self.get_tags_in_range(0, start, start + n_in, self._tag_key)
+
+        for t in tags:
+            try:
+                v = float(pmt.to_double(t.value))
+            except Exception:
+                continue
+            if math.isfinite(v):
+                msg = pmt.dict_add(pmt.make_dict(), self._key, pmt.from_double(v))
+                self.message_port_pub(pmt.intern("out"), msg)
+
+        self.consume(0, n_in)
+        return 0
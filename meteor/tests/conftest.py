@@ -0,0 +1,6 @@
+# The blocks import each other as top level modules (from pdu import ...),
+# like GRC does with the meteor directory on its path.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
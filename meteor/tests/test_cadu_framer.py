@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("gnuradio")
+pmt = pytest.importorskip("pmt")
+
+from cadu_framer import CaduFramer
+
+
+ASM_BITS = np.unpackbits(np.frombuffer((0x1ACFFC1D).to_bytes(4, "big"), dtype=np.uint8))
+FRAME_BYTES = 16
+
+
+def make_stream(n_frames, lead=37, seed=0):
+    """lead random bits, then n_frames of ASM + random frame; returns (bits, frames)."""
+    rng = np.random.default_rng(seed)
+    parts = [rng.integers(0, 2, lead).astype(np.uint8)]
+    frames = []
+    for _ in range(n_frames):
+        frame = rng.integers(0, 2, FRAME_BYTES * 8).astype(np.uint8)
+        parts += [ASM_BITS, frame]
+        frames.append(frame)
+    return np.concatenate(parts), frames
+
+
+def run_framer(framer, chunks, port="cadu"):
+    """Feed chunks to general_work directly, return the messages published on port."""
+    published = []
+    consumed = [0]
+    framer.message_port_pub = lambda p, msg: published.append(msg) if pmt.symbol_to_string(p) == port else None
+    framer.nitems_read = lambda i: consumed[0]
+    framer.consume_each = lambda n: consumed.__setitem__(0, consumed[0] + n)
+    for chunk in chunks:
+        framer.general_work([chunk], [])
+    return published
+
+
+def metric(msg, name):
+    return pmt.to_long(pmt.dict_ref(msg, pmt.intern(name), pmt.PMT_NIL))
+
+
+def payload_bits(msg):
+    return np.array(pmt.u8vector_elements(pmt.cdr(msg)), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("split_in_asm", range(1, 32))
+def test_asm_split_across_work_calls(split_in_asm):
+    bits, frames = make_stream(4)
+
+    # after the first frame the framer is in LOCK, where the ASM is only
+    # checked at the expected offset; cut the input inside that ASM
+    second_asm = 37 + 32 + FRAME_BYTES * 8
+    cut = second_asm + split_in_asm
+
+    framer = CaduFramer(cadu_len_bytes=FRAME_BYTES, verify_frames=0)
+    published = run_framer(framer, [bits[:cut], bits[cut:]])
+
+    assert framer.slip_count == 0
+    assert len(published) == len(frames)
+    for msg, frame in zip(published, frames):
+        np.testing.assert_array_equal(payload_bits(msg), frame)
+
+
+def test_same_frames_for_any_chunking():
+    bits, frames = make_stream(6)
+
+    for n_chunks in (1, 3, 7, 50, 400):
+        framer = CaduFramer(cadu_len_bytes=FRAME_BYTES, verify_frames=2)
+        published = run_framer(framer, np.array_split(bits, n_chunks))
+
+        assert framer.slip_count == 0
+        assert [payload_bits(m).tolist() for m in published] == [f.tolist() for f in frames]
+
+
+def test_sync_loss_is_published_on_metrics():
+    bits, frames = make_stream(3)
+    noise = np.random.default_rng(1).integers(0, 2, 8 * (32 + FRAME_BYTES * 8)).astype(np.uint8)
+
+    framer = CaduFramer(cadu_len_bytes=FRAME_BYTES, verify_frames=1, miss_limit=2)
+    published = run_framer(framer, [bits, noise], port="metrics")
+
+    states = []
+    for m in published:
+        state = (metric(m, "frame_lock"), metric(m, "slip_count"))
+        if not states or states[-1] != state:  # leave out the periodic stats
+            states.append(state)
+    assert states == [
+        (CaduFramer.SYNC_VERIFY, 0),
+        (CaduFramer.SYNC_LOCK, 0),
+        (CaduFramer.SYNC_SEARCH, 1),
+    ]
+
+
+def test_frame_stats_are_published_every_few_frames():
+    n = 3 * CaduFramer.METRICS_EVERY
+    bits, frames = make_stream(n)
+
+    framer = CaduFramer(cadu_len_bytes=FRAME_BYTES, verify_frames=0)
+    published = run_framer(framer, [bits], port="metrics")
+
+    # the state change to LOCK, then the periodic stats
+    every = CaduFramer.METRICS_EVERY
+    assert [metric(m, "frames") for m in published] == [0] + list(range(every, n + 1, every))
+    assert all(metric(m, "frame_lock") == CaduFramer.SYNC_LOCK for m in published)
+    assert all(metric(m, "asm_errors") == 0 for m in published)
+
+
+def test_failed_verify_is_no_slip():
+    bits, frames = make_stream(1)
+    noise = np.random.default_rng(2).integers(0, 2, 32 + FRAME_BYTES * 8).astype(np.uint8)
+
+    # one ASM, then no marker where the next one should be: back to SEARCH
+    framer = CaduFramer(cadu_len_bytes=FRAME_BYTES, verify_frames=2)
+    published = run_framer(framer, [bits, noise], port="metrics")
+
+    states = [metric(m, "frame_lock") for m in published]
+    assert states == [CaduFramer.SYNC_VERIFY, CaduFramer.SYNC_SEARCH]
+    assert framer.slip_count == 0
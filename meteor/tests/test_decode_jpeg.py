@@ -0,0 +1,41 @@
+from decode_jpeg import T_AC_0, get_ac_real, get_dc_real, init_huffman_table
+
+
+def reference_ac_codes():
+    """(run, size, length, code) of every AC code, walking all 2^k codes of each length."""
+    codes = []
+    code = 0
+    p = 16
+    for k in range(1, 17):
+        count = T_AC_0[k - 1]
+        for i in range(1 << k):
+            if code <= i < code + count:
+                size_val = T_AC_0[p + i - code]
+                codes.append((size_val >> 4, size_val & 0xF, k, i))
+        p += count
+        code = (code + count) * 2
+    return codes
+
+
+def test_ac_table_matches_per_code_walk():
+    ac_table, _, _ = init_huffman_table()
+
+    assert len(ac_table) == 162
+    assert [(e.run, e.size, e.length, e.code) for e in ac_table] == reference_ac_codes()
+    assert all(e.mask == (1 << e.length) - 1 for e in ac_table)
+
+
+def test_ac_lookup_matches_get_ac_real():
+    ac_table, ac_lookup, _ = init_huffman_table()
+
+    assert len(ac_lookup) == 1 << 16
+    for word in range(1 << 16):
+        assert ac_lookup[word] == get_ac_real(word, ac_table), f"word {word:#06x}"
+
+
+def test_dc_lookup_matches_get_dc_real():
+    _, _, dc_lookup = init_huffman_table()
+
+    assert len(dc_lookup) == 1 << 16
+    for word in range(1 << 16):
+        assert dc_lookup[word] == get_dc_real(word), f"word {word:#06x}"
@@ -5,51 +5,112 @@
 # Behaviour:
 # - Requires minimum 6 bytes (VCDU Primary Header)
 # - Parses header fields
+# - Tracks the VCDU counter per virtual channel, vcdu.lost_frames is the
+#   number of frames missing before this one (-1: counter went backwards)
+# - Frames tagged rs.failed (CcsdsRsDecoder pass_failed) are passed on
+#   without parsing or counter tracking, their header can not be trusted;
+#   the next frame of their channel shows the gap like for a dropped frame
 # - Outputs payload (bytes after first 6)
 #
 
 import pmt
 from gnuradio import gr
 
+from pdu import make_pdu, meta_long, pdu_to_numpy
+
+
+VCDU_PRIMARY_HEADER_LEN = 6
+VCDU_COUNTER_MODULO = 1 << 24
+
+
+def parse_vcdu_header(data):
+    """VCDU primary header fields of data (at least 6 bytes), as a dict."""
+    b0, b1, b2, b3, b4, b5 = data[0:6]
+
+    return {
+        "version_number": (b0 >> 6) & 0x03,
+        "spacecraft_id": ((b0 & 0x3F) << 2) | ((b1 >> 6) & 0x03),
+        "virtual_channel_id": b1 & 0x3F,
+        "vcdu_counter": (b2 << 16) | (b3 << 8) | b4,
+        "signalling_field_raw": b5,
+        "replay_flag": (b5 >> 7) & 1,
+    }
+
+
+def vcdu_meta(meta, header):
+    """meta with the vcdu.* keys of a parse_vcdu_header() dict added."""
+    for name, value in header.items():
+        meta = pmt.dict_add(meta, pmt.intern("vcdu." + name), pmt.from_long(value))
+    return meta
+
+
+class VcduCounterTracker:
+    """
+    VCDU counter continuity per virtual channel (24 bit, wrapping).
+    update() returns the number of frames lost since the channel's previous
+    frame: 0 if continuous (or the channel's first frame), -1 if the counter
+    repeated or went backwards (a discontinuity of unknown size).
+    """
+
+    def __init__(self):
+        self._last = {}  # virtual channel id -> last VCDU counter
+        self.lost_frames = 0
+        self.discontinuities = 0
+
+    def update(self, virtual_channel_id, vcdu_counter):
+        last = self._last.get(virtual_channel_id)
+        self._last[virtual_channel_id] = vcdu_counter
+        if last is None:
+            return 0
+
+        gap = (vcdu_counter - last - 1) % VCDU_COUNTER_MODULO
+        if gap == 0:
+            return 0
+
+        self.discontinuities += 1
+        if gap >= VCDU_COUNTER_MODULO // 2:
+            return -1
+
+        self.lost_frames += gap
+        return gap
+
+
+def track_vcdu_header(tracker, header):
+    """Add lost_frames (see VcduCounterTracker.update) to a parse_vcdu_header() dict."""
+    header["lost_frames"] = tracker.update(header["virtual_channel_id"], header["vcdu_counter"])
+    return header
+
 
 class VcduParser(gr.basic_block):
 
-    VCDU_PRIMARY_HEADER_LEN = 6
+    VCDU_PRIMARY_HEADER_LEN = VCDU_PRIMARY_HEADER_LEN
 
     def __init__(self):
         gr.basic_block.__init__(self, name="vcdu_parser", in_sig=None, out_sig=None)
 
+        self._tracker = VcduCounterTracker()
+
         self.message_port_register_in(pmt.intern("in"))
         self.message_port_register_out(pmt.intern("out"))
         self.set_msg_handler(pmt.intern("in"), self._handle)
 
+    @property
+    def lost_frames(self):
+        return self._tracker.lost_frames
+
     def _handle(self, msg):
-        meta_in = pmt.car(msg)
-        data = bytes(pmt.u8vector_elements(pmt.cdr(msg)))
+        meta_in, data = pdu_to_numpy(msg)
 
         if len(data) < self.VCDU_PRIMARY_HEADER_LEN:
             self.logger.error(f"VCDU too short: {len(data)} bytes")
             return
 
-        b0, b1, b2, b3, b4, b5 = data[0:6]
-
-        version_number = (b0 >> 6) & 0x03
-        spacecraft_id = ((b0 & 0x3F) << 2) | ((b1 >> 6) & 0x03)
-        virtual_channel_id = b1 & 0x3F
-        vcdu_counter = (b2 << 16) | (b3 << 8) | b4
-
-        signalling_field = b5
-        replay_flag = (b5 >> 7) & 1
-
-        payload = data[self.VCDU_PRIMARY_HEADER_LEN:]
+        if meta_long(meta_in, "rs.failed"):
+            self.message_port_pub(pmt.intern("out"), make_pdu(meta_in, data, self.VCDU_PRIMARY_HEADER_LEN))
+            return
 
-        meta = meta_in
-        meta = pmt.dict_add(meta, pmt.intern("vcdu.version_number"), pmt.from_long(version_number))
-        meta = pmt.dict_add(meta, pmt.intern("vcdu.spacecraft_id"), pmt.from_long(spacecraft_id))
-        meta = pmt.dict_add(meta, pmt.intern("vcdu.virtual_channel_id"), pmt.from_long(virtual_channel_id))
-        meta = pmt.dict_add(meta, pmt.intern("vcdu.vcdu_counter"), pmt.from_long(vcdu_counter))
-        meta = pmt.dict_add(meta, pmt.intern("vcdu.signalling_field_raw"), pmt.from_long(signalling_field))
-        meta = pmt.dict_add(meta, pmt.intern("vcdu.replay_flag"), pmt.from_long(replay_flag))
+        header = parse_vcdu_header(data[:self.VCDU_PRIMARY_HEADER_LEN].tolist())
+        track_vcdu_header(self._tracker, header)
+        meta = vcdu_meta(meta_in, header)
 
-        vec = pmt.init_u8vector(len(payload), list(payload))
-        self.message_port_pub(pmt.intern("out"), pmt.cons(meta, vec))
\ No newline at end of file
+        self.message_port_pub(pmt.intern("out"), make_pdu(meta, data, self.VCDU_PRIMARY_HEADER_LEN))
\ No newline at end of file
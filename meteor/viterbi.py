@@ -8,48 +8,58 @@
 # GNU Radio version: 3.10.12.0
 
 import numpy as np
+import pmt
 from gnuradio import gr
 from gnuradio import gr
-from gnuradio import fec
 
-def _parity_u32(x: int) -> int:
-    # parity of integer bits (0/1)
-    x ^= x >> 16
-    x ^= x >> 8
-    x ^= x >> 4
-    x &= 0xF
-    return (0x6996 >> x) & 1
+from viterbi_decoder import ViterbiDecoder
 
-
-def _conv_encode_k7_r12(bits_u8: np.ndarray, poly0: int, poly1: int) -> np.ndarray:
+def _conv_encode_k7_r12(bits_u8: np.ndarray, poly0: int, poly1: int, state: int = 0):
     """
     Convolutional encode K=7, rate 1/2, polys given like the C++ code.
     If a poly is negative, we invert that output bit (matches your mapping).
     Output is unpacked bits (0/1) length = 2*len(bits).
+
+    `state` is the encoder register (last 6 input bits) from the previous
+    call, so consecutive windows encode like one continuous stream.
+    Returns (out, state).
     """
     inv0 = 1 if poly0 < 0 else 0
     inv1 = 1 if poly1 < 0 else 0
     p0 = abs(int(poly0))
     p1 = abs(int(poly1))
 
-    reg = 0
-    out = np.empty(bits_u8.size * 2, dtype=np.uint8)
+    n = bits_u8.size
 
-    # K=7 => 7-bit shift reg. We'll keep it in lower 7 bits.
-    # Convention here: shift left, OR in new bit at LSB (common in many encoders).
+    # K=7 => 7-bit shift reg: shift left, new bit at LSB, so register bit k
+    # holds the input from k steps ago. ext = 6 previous bits (oldest first)
+    # followed by the new ones, and output i is the XOR of the tapped
+    # ext[6 + i - k].
     # IMPORTANT: if your encoder uses opposite bit order, BER will differ.
     # But for CCSDS K=7 this convention typically matches common implementations.
-    for i, b in enumerate(bits_u8):
-        bit = int(b) & 1
-        reg = ((reg << 1) | bit) & 0x7F
+    ext = np.empty(n + 6, dtype=np.uint8)
+    for k in range(6):
+        ext[5 - k] = (state >> k) & 1
+    ext[6:] = bits_u8 & 1
+
+    out = np.empty(n * 2, dtype=np.uint8)
+    o0 = np.full(n, inv0, dtype=np.uint8)
+    o1 = np.full(n, inv1, dtype=np.uint8)
+    for k in range(7):
+        tap = ext[6 - k:6 - k + n]
+        if (p0 >> k) & 1:
+            o0 ^= tap
+        if (p1 >> k) & 1:
+            o1 ^= tap
 
-        o0 = _parity_u32(reg & p0) ^ inv0
-        o1 = _parity_u32(reg & p1) ^ inv1
+    out[0::2] = o0
+    out[1::2] = o1
 
-        out[2 * i + 0] = o0
-        out[2 * i + 1] = o1
+    state = 0
+    for b in ext[n:]:
+        state = (state << 1) | int(b)
 
-    return out
+    return out, state
 
 
 class ber_ccsds_soft_decoded(gr.basic_block):
@@ -68,7 +78,7 @@ class ber_ccsds_soft_decoded(gr.basic_block):
       1: decoded bits stream (char, values 0/1, length = soft/2)
 
     Output:
-      0: float BER stream (hold-last; updates when a full window is available)
+      message port 'ber': PMT dict {"ber": value}, one per full window
     """
 
     def __init__(self, poly0=79, poly1=109, window=4096, erase_eps=0.0, scale=2.5):
@@ -76,7 +86,7 @@ class ber_ccsds_soft_decoded(gr.basic_block):
             self,
             name="ber_ccsds_soft_decoded",
             in_sig=[np.float32, np.uint8],
-            out_sig=[np.float32],
+            out_sig=[],
         )
 
         self._poly0 = int(poly0)
@@ -94,11 +104,14 @@ class ber_ccsds_soft_decoded(gr.basic_block):
         self._dec_fill = 0
 
         self._last = 10.0 
+        self._enc_state = 0  # encoder register carried from window to window
+
+        self._port = pmt.intern("ber")
+        self.message_port_register_out(self._port)
 
     def general_work(self, input_items, output_items):
         soft_in = input_items[0]
         dec_in = input_items[1]
-        out = output_items[0]
 
         n_soft = len(soft_in)
         n_dec = len(dec_in)
@@ -134,7 +147,7 @@ class ber_ccsds_soft_decoded(gr.basic_block):
                 raw[er] = 128
 
             # re-encode decoded bits
-            renc = _conv_encode_k7_r12(self._dec_buf, self._poly0, self._poly1)
+            renc, self._enc_state = _conv_encode_k7_r12(self._dec_buf, self._poly0, self._poly1, self._enc_state)
 
             mask = (raw != 128)
             total = int(mask.sum())
@@ -148,31 +161,44 @@ class ber_ccsds_soft_decoded(gr.basic_block):
             self._soft_fill = 0
             self._dec_fill = 0
 
-        # Output: hold-last value (emit as many as scheduler requests)
-        n_out = len(out)
-        if n_out == 0:
-            return 0
-        out[:] = np.float32(self._last)
-        return n_out
+            msg = pmt.dict_add(pmt.make_dict(), pmt.intern("ber"), pmt.from_double(self._last))
+            self.message_port_pub(self._port, msg)
+
+        return 0
 
 
 class Viterbi(gr.hier_block2):
-    def __init__(self):
+    """
+    K=7 r=1/2 soft decision decoder plus BER estimate.
+
+    decoder="gr-fec": fec.cc_decoder in an extended_decoder (frame size 80,
+                      CC_STREAMING)
+    decoder="numpy":  the in-repo ViterbiDecoder, no gr-fec needed
+    """
+
+    def __init__(self, decoder="gr-fec", traceback_depth=64, chunk=4096):
         gr.hier_block2.__init__(
             self, "viterbi",
             gr.io_signature(1, 1, gr.sizeof_float),
-            gr.io_signature(2, 2, [gr.sizeof_char, gr.sizeof_float]),
+            gr.io_signature(1, 1, gr.sizeof_char),
         )
+        self.message_port_register_hier_out("ber")
         
         polys = [109, 79]
-    
 
-        self.dec_cc = dec_cc = fec.cc_decoder.make(
-            80, 7, 2, polys, 0, -1, fec.CC_STREAMING, False)
+        if decoder == "numpy":
+            self.vit = ViterbiDecoder(poly0=polys[0], poly1=polys[1], traceback_depth=traceback_depth, chunk=chunk)
+        elif decoder == "gr-fec":
+            from gnuradio import fec
+
+            self.dec_cc = dec_cc = fec.cc_decoder.make(
+                80, 7, 2, polys, 0, -1, fec.CC_STREAMING, False)
 
-        self.vit = fec.extended_decoder(
-            decoder_obj_list=dec_cc, threading=None, ann=None,
-            puncpat='11', integration_period=10000)
+            self.vit = fec.extended_decoder(
+                decoder_obj_list=dec_cc, threading=None, ann=None,
+                puncpat='11', integration_period=10000)
+        else:
+            raise ValueError(f"unknown decoder {decoder!r}, expected 'gr-fec' or 'numpy'")
 
         self.connect((self.vit, 0), (self, 0))
         self.connect((self, 0), (self.vit, 0))
@@ -181,7 +207,7 @@ class Viterbi(gr.hier_block2):
 
         self.connect((self, 0), (self.ber, 0))          # soft float
         self.connect((self.vit, 0), (self.ber, 1))      # decoded bits 0/1
-        self.connect((self.ber, 0), (self, 1))          # BER float -> out1
+        self.msg_connect((self.ber, 'ber'), (self, 'ber'))  # BER dict -> 'ber' port
 
 
 
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+#
+# viterbi_decoder.py - GNU Radio Python block (soft symbols -> decoded bits)
+#
+# Input:  float soft symbols, two per bit (positive = 1)
+# Output: uint8 decoded bits (0/1), traceback_depth bits behind the input
+#
+import numpy as np
+from gnuradio import gr
+
+from viterbi_k7 import ViterbiK7
+
+
+class ViterbiDecoder(gr.basic_block):
+    """
+    K=7 rate 1/2 soft decision Viterbi decoder in numpy (see viterbi_k7),
+    a drop-in for gr-fec's cc_decoder in CC_STREAMING mode.
+
+    - traceback_depth: decisions kept behind the best path before a bit is
+      released; more is more reliable, but adds latency
+    - chunk: traceback runs once per `chunk` decoded bits; bigger chunks
+      mean less overhead per bit, but burstier output
+    """
+
+    def __init__(self, poly0=109, poly1=79, traceback_depth=64, chunk=4096):
+        gr.basic_block.__init__(
+            self,
+            name="viterbi_decoder",
+            in_sig=[np.float32],
+            out_sig=[np.uint8],
+        )
+
+        self._decoder = ViterbiK7(poly0, poly1, traceback_depth, chunk)
+
+        # decoded bits that did not fit into the output buffer yet
+        self._pending = np.empty(0, dtype=np.uint8)
+
+    def forecast(self, noutput_items, ninputs):
+        # two soft symbols per bit, but output comes in traceback bursts:
+        # take whatever is there
+        return [1] * ninputs
+
+    def general_work(self, input_items, output_items):
+        out = output_items[0]
+
+        if len(self._pending) == 0:
+            in0 = input_items[0]
+            self._pending = self._decoder.decode(in0)
+            self.consume_each(len(in0))
+
+        n = min(len(out), len(self._pending))
+        out[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
@@ -0,0 +1,343 @@
+# viterbi_k7.py
+# Soft decision Viterbi decoder for the K=7, rate 1/2 convolutional code
+# (CCSDS / NASA-DSN), plain numpy, no gr-fec.
+#
+# Conventions match _conv_encode_k7_r12 in viterbi.py and gr-fec's cc_decoder:
+# the encoder shifts the new bit in at the LSB (reg = (reg << 1) | bit),
+# symbol k is parity(reg & poly_k), a negative poly inverts its symbol,
+# and a positive soft value means bit 1.
+#
+# Offline use (whole recording of soft symbols, float32, two per bit):
+#   python viterbi_k7.py soft.f32 bits.u8 --workers 8
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+
+K = 7
+N_STATES = 1 << (K - 1)
+HALF = N_STATES // 2
+
+# soft float -> int scaling, same as gr-fec's extended_decoder (x * 48 + 128)
+SOFT_SCALE = 48.0
+SOFT_MAX = 127
+
+# path metrics are int16; a branch costs at most 2 * 2 * SOFT_MAX, so after
+# RENORM_INTERVAL steps without renormalisation the metrics are still below
+# INITIAL_PENALTY + RENORM_INTERVAL * 508 < 32767
+RENORM_INTERVAL = 32
+INITIAL_PENALTY = 4096
+
+# branch costs are computed for this many steps at a time
+STEP_BLOCK = 256
+
+# expected symbol pair index e = 2 * sym0 + sym1 -> sign of each symbol
+_SIGN = np.array([[-1, -1], [-1, 1], [1, -1], [1, 1]], dtype=np.int16)
+
+
+def _parity(x: int) -> int:
+    return bin(x).count("1") & 1
+
+
+def branch_symbols(poly0: int, poly1: int) -> np.ndarray:
+    """
+    Expected symbol pair of every 7-bit encoder register, as index
+    2 * sym0 + sym1 into the per-step cost table. Shape (128,).
+    """
+    inv0 = 1 if poly0 < 0 else 0
+    inv1 = 1 if poly1 < 0 else 0
+    p0 = abs(int(poly0))
+    p1 = abs(int(poly1))
+
+    sym = np.empty(1 << K, dtype=np.intp)
+    for reg in range(1 << K):
+        s0 = _parity(reg & p0) ^ inv0
+        s1 = _parity(reg & p1) ^ inv1
+        sym[reg] = 2 * s0 + s1
+    return sym
+
+
+def quantize_soft(soft: np.ndarray) -> np.ndarray:
+    q = np.rint(np.asarray(soft, dtype=np.float32) * SOFT_SCALE)
+    return np.clip(q, -SOFT_MAX, SOFT_MAX).astype(np.int16)
+
+
+def initial_metrics(start_states) -> np.ndarray:
+    """
+    Path metrics for len(start_states) streams, shape (C, 64).
+    A start state of None means all states are equally likely.
+    """
+    pm = np.full((len(start_states), N_STATES), INITIAL_PENALTY, dtype=np.int16)
+    for c, state in enumerate(start_states):
+        if state is None:
+            pm[c] = 0
+        else:
+            pm[c, int(state) & (N_STATES - 1)] = 0
+    return pm
+
+
+def acs(pm: np.ndarray, q: np.ndarray, sym: np.ndarray, since: int = 0) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Add-compare-select of C independent streams in lockstep.
+
+    pm:    (C, 64) int16 path metrics
+    q:     (n, C, 2) quantized soft symbol pairs, time major
+    sym:   branch_symbols() of the code
+    since: steps since the last renormalisation
+
+    Trellis state = the last 6 input bits, newest at the LSB. New state ns
+    is reached from ns >> 1 (oldest bit 0) or (ns >> 1) | 32 (oldest bit 1),
+    so the 64 add-compare-selects of a step are two (C, 32, 2) array ops:
+    row j holds the new states 2j and 2j + 1, both fed by predecessors j
+    and j + 32.
+
+    Returns (pm, words, since); words (n, C) uint64 has the decisions of a
+    step packed, bit ns = oldest bit of the survivor into ns.
+    """
+    n, C = q.shape[0], q.shape[1]
+    words = np.empty((n, C), dtype=np.uint64)
+
+    a = np.empty((C, HALF, 2), dtype=np.int16)
+    b = np.empty((C, HALF, 2), dtype=np.int16)
+
+    for t0 in range(0, n, STEP_BLOCK):
+        qb = q[t0:t0 + STEP_BLOCK]
+        T = qb.shape[0]
+
+        # cost 0 for a perfect match, 2 * SOFT_MAX per symbol for a perfect mismatch
+        costs = (2 * SOFT_MAX) - (qb[:, :, None, 0] * _SIGN[:, 0] + qb[:, :, None, 1] * _SIGN[:, 1])
+        bm0 = costs[:, :, sym[:N_STATES]].reshape(T, C, HALF, 2)   # register = ns
+        bm1 = costs[:, :, sym[N_STATES:]].reshape(T, C, HALF, 2)   # register = 64 | ns
+        dec = np.empty((T, C, HALF, 2), dtype=bool)
+
+        for t in range(T):
+            np.add(pm[:, :HALF, None], bm0[t], out=a)
+            np.add(pm[:, HALF:, None], bm1[t], out=b)
+            np.less(b, a, out=dec[t])
+            pm = np.minimum(a, b).reshape(C, N_STATES)
+
+            since += 1
+            if since == RENORM_INTERVAL:
+                pm -= pm.min(axis=1, keepdims=True)
+                since = 0
+
+        packed = np.packbits(dec.reshape(T, C, N_STATES), axis=2, bitorder="little")
+        words[t0:t0 + T] = packed.view("<u8").reshape(T, C)
+
+    return pm, words, since
+
+
+def traceback(words: np.ndarray, states: np.ndarray) -> np.ndarray:
+    """
+    Trace back C streams through words (n, C), ending in states (C,).
+    Returns the decoded bits, (n, C) uint8.
+    """
+    n, C = words.shape
+    bits = np.empty((n, C), dtype=np.uint8)
+    s = np.asarray(states, dtype=np.uint64).copy()
+    for t in range(n - 1, -1, -1):
+        bits[t] = s & 1
+        s = (s >> 1) | (((words[t] >> s) & 1) << (K - 2))
+    return bits
+
+
+def traceback_one(words: np.ndarray, state: int, n_out: int) -> np.ndarray:
+    """
+    traceback() of a single stream, words (n,); plain ints are much faster
+    than numpy for one stream. Returns the first n_out bits.
+    """
+    w = words.tolist()
+    bits = bytearray(len(w))
+    s = state
+    for t in range(len(w) - 1, -1, -1):
+        bits[t] = s & 1
+        s = (s >> 1) | (((w[t] >> s) & 1) << (K - 2))
+    return np.frombuffer(bytes(bits[:n_out]), dtype=np.uint8)
+
+
+class ViterbiK7:
+    """
+    Streaming K=7 r=1/2 soft decision Viterbi decoder (one stream of acs()).
+
+    Traceback runs every `chunk` steps from the best state, and releases
+    the bits older than `traceback_depth` steps.
+    """
+
+    def __init__(self, poly0: int = 109, poly1: int = 79, traceback_depth: int = 64, chunk: int = 4096, start_state: Optional[int] = 0):
+        if traceback_depth <= 0:
+            raise ValueError("traceback_depth must be positive")
+
+        self.traceback_depth = int(traceback_depth)
+        self.chunk = max(1, int(chunk))
+        self._sym = branch_symbols(poly0, poly1)
+
+        self.reset(start_state)
+
+    def reset(self, start_state: Optional[int] = 0):
+        """Start a new stream in `start_state`, or with all states equal if None."""
+        self._pm = initial_metrics([start_state])
+        self._since_renorm = 0
+        self._odd: Optional[np.float32] = None      # unpaired soft symbol
+        self._words = np.empty(0, dtype=np.uint64)  # decisions not traced back yet
+
+    def _acs(self, soft: np.ndarray) -> np.ndarray:
+        soft = np.asarray(soft, dtype=np.float32)
+        if self._odd is not None:
+            soft = np.concatenate(([self._odd], soft))
+            self._odd = None
+        if len(soft) % 2:
+            self._odd = soft[-1]
+            soft = soft[:-1]
+
+        if len(soft) == 0:
+            return np.empty(0, dtype=np.uint64)
+
+        q = quantize_soft(soft).reshape(-1, 1, 2)
+        self._pm, words, self._since_renorm = acs(self._pm, q, self._sym, self._since_renorm)
+        return words[:, 0]
+
+    def best_state(self) -> int:
+        return int(np.argmin(self._pm[0]))
+
+    def decode(self, soft: np.ndarray) -> np.ndarray:
+        """
+        Decode a piece of the soft symbol stream. Bits come out traceback_depth
+        steps late and in bursts of at least `chunk` bits.
+        """
+        words = self._acs(soft)
+        if len(words) > 0:
+            self._words = np.concatenate((self._words, words))
+
+        n_out = len(self._words) - self.traceback_depth
+        if n_out < self.chunk:
+            return np.empty(0, dtype=np.uint8)
+
+        bits = traceback_one(self._words, self.best_state(), n_out)
+        self._words = self._words[n_out:]
+        return bits
+
+    def flush(self) -> np.ndarray:
+        """End of stream: release all remaining bits, traced back from the best state."""
+        bits = traceback_one(self._words, self.best_state(), len(self._words))
+        self._words = np.empty(0, dtype=np.uint64)
+        return bits
+
+
+# ---------------- OFFLINE, CHUNKED ----------------
+
+def decode_spans(q: np.ndarray, start_states, skip: np.ndarray, length: int, poly0: int, poly1: int) -> np.ndarray:
+    """
+    Decode C windows of quantized soft symbols side by side, q (n, C, 2).
+
+    Window c starts in start_states[c] (None = unknown), is traced back from
+    its best final state, and bits skip[c] .. skip[c] + length of it are
+    returned, shape (C, length). Runs in the worker processes.
+    """
+    pm, words, _ = acs(initial_metrics(start_states), q, branch_symbols(poly0, poly1))
+    bits = traceback(words, np.argmin(pm, axis=1))
+
+    cols = np.arange(q.shape[1])
+    rows = np.asarray(skip)[:, None] + np.arange(length)
+    return bits[rows, cols[:, None]]
+
+
+def _span_batches(soft: np.ndarray, chunk_bits: int, margin: int, batch: int) -> Iterator[Tuple[np.ndarray, list, np.ndarray, int]]:
+    """
+    Cut soft symbols into windows of chunk_bits output bits plus `margin`
+    bits of warm-up before and traceback after, grouped `batch` at a time.
+
+    The first window has no warm-up, it starts in state 0 like the stream;
+    the others start with all states equal and run through the warm-up to
+    converge. Windows are padded with 0 (no information) past the end.
+    """
+    n_bits = len(soft) // 2
+    n_chunks = (n_bits + chunk_bits - 1) // chunk_bits
+    window = chunk_bits + 2 * margin
+
+    for first in range(0, n_chunks, batch):
+        ids = range(first, min(first + batch, n_chunks))
+        q = np.zeros((window, len(ids), 2), dtype=np.int16)
+        start_states = []
+        skip = np.empty(len(ids), dtype=np.intp)
+
+        for c, k in enumerate(ids):
+            begin = 0 if k == 0 else k * chunk_bits - margin
+            end = min(begin + window, n_bits)
+            q[:end - begin, c] = quantize_soft(soft[2 * begin:2 * end]).reshape(-1, 2)
+            start_states.append(0 if k == 0 else None)
+            skip[c] = k * chunk_bits - begin
+
+        yield q, start_states, skip, len(ids)
+
+
+def decode_parallel(soft: np.ndarray, poly0: int = 109, poly1: int = 79, workers: int = 0,
+                    chunk_bits: int = 65536, margin: int = 256, batch: int = 16) -> Iterator[np.ndarray]:
+    """
+    Decode a complete recording of soft symbols, in order, chunk_bits bits per
+    yielded array (the last one may be shorter).
+
+    Every chunk is decoded with `margin` bits of overlap on both sides, so
+    the seams do not need a shared trellis: with a margin of a few times the
+    constraint length the survivors have merged by the chunk boundary, and
+    the chunks add up to the same bits as one long decode. `batch` chunks
+    share one acs() run; with workers > 0 batches run on a process pool.
+    """
+    n_bits = len(soft) // 2
+    batches = _span_batches(soft, int(chunk_bits), int(margin), max(1, int(batch)))
+
+    def emit(bits: np.ndarray, start: int) -> Iterator[np.ndarray]:
+        for c in range(bits.shape[0]):
+            k0 = start + c * chunk_bits
+            yield bits[c, :max(0, min(chunk_bits, n_bits - k0))]
+
+    done = 0
+    if int(workers) <= 0:
+        for q, start_states, skip, count in batches:
+            yield from emit(decode_spans(q, start_states, skip, chunk_bits, poly0, poly1), done)
+            done += count * chunk_bits
+        return
+
+    # spawn, not fork: this may run next to a threaded flowgraph; a bounded
+    # number of batches in flight keeps memory flat on long recordings
+    with ProcessPoolExecutor(max_workers=int(workers), mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = deque()
+        for q, start_states, skip, count in batches:
+            pending.append((pool.submit(decode_spans, q, start_states, skip, chunk_bits, poly0, poly1), count))
+            if len(pending) >= 2 * int(workers):
+                future, count = pending.popleft()
+                yield from emit(future.result(), done)
+                done += count * chunk_bits
+
+        while pending:
+            future, count = pending.popleft()
+            yield from emit(future.result(), done)
+            done += count * chunk_bits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline K=7 r=1/2 Viterbi decoding of a soft symbol recording")
+    parser.add_argument("input", help="soft symbols, float32, two per bit")
+    parser.add_argument("output", help="decoded bits, one uint8 (0/1) per bit")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--chunk-bits", type=int, default=65536)
+    parser.add_argument("--margin", type=int, default=256)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--poly0", type=int, default=109)
+    parser.add_argument("--poly1", type=int, default=79)
+    args = parser.parse_args()
+
+    soft = np.memmap(args.input, dtype=np.float32, mode="r")
+    with open(args.output, "wb") as f:
+        for bits in decode_parallel(soft, args.poly0, args.poly1, args.workers, args.chunk_bits, args.margin, args.batch):
+            f.write(bits.tobytes())
+
+
+if __name__ == "__main__":
+    main()